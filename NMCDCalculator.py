@@ -11,19 +11,31 @@ import sys
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QLabel, QLineEdit, QPushButton, QCheckBox, QGroupBox, QComboBox,
-    QMessageBox, QDateEdit, QFileDialog
+    QMessageBox, QDateEdit, QFileDialog, QProgressDialog, QTableView,
+    QHeaderView, QAbstractItemView, QCompleter
 )
-from PyQt6.QtCore import Qt, QDate, QLocale
+from PyQt6.QtCore import Qt, QDate, QLocale, QThreadPool, QTimer, QStringListModel
 from PyQt6.QtGui import QDoubleValidator
 
-import openpyxl
-from openpyxl.workbook import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-import math
 from datetime import datetime
 import os
 
+import nmcd_profile
+import nmcd_workers
+from nmcd_quote_table import QuoteTableModel, PriceDelegate, COLUMN_NAME
+
+# nmcd_core (numpy) и nmcd_excel (openpyxl) импортируются при первом
+# использовании, чтобы не замедлять запуск окна
+
+# Задержка пересчета после последнего изменения цены, мс
+LIVE_RECALC_DELAY_MS = 250
+
+# Строк поставщиков в новой таблице
+INITIAL_SUPPLIER_ROWS = 5
+
+# Подсказки из истории цен — начиная с этого количества введенных символов
+HISTORY_MIN_PREFIX = 2
+
 class NMCDCalculatorApp(QWidget):
     def __init__(self):
         super().__init__()
@@ -32,6 +44,19 @@ class NMCDCalculatorApp(QWidget):
 
         self.prices = []
         self.calculated_data = None
+        self.active_task = None
+        self.price_history = None
+        self.project_model = None
+
+        # Живой пересчет: накопитель статистики, учтенные в нем цены по
+        # строке таблицы поставщиков и изменения, ожидающие применения
+        self.live_stats = None
+        self.live_prices = {}
+        self.pending_price_changes = {}
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(LIVE_RECALC_DELAY_MS)
+        self.live_timer.timeout.connect(self.apply_live_changes)
 
         self.init_ui()
 
@@ -54,6 +79,19 @@ class NMCDCalculatorApp(QWidget):
         self.item_name_input = QLineEdit(self)
         general_layout.addWidget(self.item_name_input, 1, 1, 1, 2)
 
+        # Подсказки наименований и подстановка цен из истории
+        self.item_completions = QStringListModel(self)
+        item_completer = QCompleter(self.item_completions, self)
+        item_completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        # Список уже отобран по истории, в том числе по словам из середины наименования
+        item_completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        item_completer.activated.connect(self.fill_from_history)
+        self.item_name_input.setCompleter(item_completer)
+        self.item_name_input.textEdited.connect(self.update_item_completions)
+        self.history_button = QPushButton("Заполнить из истории", self)
+        self.history_button.clicked.connect(lambda: self.fill_from_history(self.item_name_input.text()))
+        general_layout.addWidget(self.history_button, 1, 3)
+
         # Quantity
         general_layout.addWidget(QLabel("Количество:"), 2, 0)
         self.quantity_input = QLineEdit(self)
@@ -71,41 +109,99 @@ class NMCDCalculatorApp(QWidget):
 
         # --- Данные поставщиков ---
         suppliers_group = QGroupBox("Данные поставщиков")
-        suppliers_layout = QGridLayout()
-
-        self.supplier_checkboxes = []
-        self.supplier_name_inputs = []
-        self.price_inputs = []
-        self.price_labels = []
-
-        for i in range(5):
-            checkbox = QCheckBox(f"Поставщик {i+1}", self)
-            checkbox.setChecked(False)
-            checkbox.stateChanged.connect(lambda state, idx=i: self.toggle_supplier_fields(state, idx))
-            self.supplier_checkboxes.append(checkbox)
-            suppliers_layout.addWidget(checkbox, i, 0)
-
-            name_input = QLineEdit(self)
-            name_input.setPlaceholderText("Название поставщика")
-            name_input.setEnabled(False)
-            self.supplier_name_inputs.append(name_input)
-            suppliers_layout.addWidget(name_input, i, 1)
-
-            price_label = QLabel("Цена:")
-            price_label.setEnabled(False)
-            self.price_labels.append(price_label)
-            suppliers_layout.addWidget(price_label, i, 2)
-
-            price_input = QLineEdit(self)
-            price_input.setPlaceholderText("Цена")
-            price_input.setValidator(self.create_float_validator())
-            price_input.setEnabled(False)
-            self.price_inputs.append(price_input)
-            suppliers_layout.addWidget(price_input, i, 3)
+        suppliers_layout = QVBoxLayout()
+
+        # Количество поставщиков не ограничено: таблица отрисовывает только видимые строки
+        self.quote_model = QuoteTableModel(self)
+        for _ in range(INITIAL_SUPPLIER_ROWS):
+            self.quote_model.add_quote(enabled=False)
+        self.quote_model.price_changed.connect(self.on_price_text_changed)
+
+        self.quote_table = QTableView(self)
+        self.quote_table.setModel(self.quote_model)
+        self.quote_table.setItemDelegate(PriceDelegate(self.quote_table))
+        self.quote_table.setEditTriggers(QAbstractItemView.EditTrigger.AllEditTriggers)
+        self.quote_table.horizontalHeader().setSectionResizeMode(COLUMN_NAME, QHeaderView.ResizeMode.Stretch)
+        self.quote_table.verticalHeader().setVisible(False)
+        suppliers_layout.addWidget(self.quote_table)
+
+        quote_buttons_layout = QHBoxLayout()
+        self.add_supplier_button = QPushButton("Добавить поставщика", self)
+        self.add_supplier_button.clicked.connect(self.add_supplier)
+        quote_buttons_layout.addWidget(self.add_supplier_button)
+        self.remove_supplier_button = QPushButton("Удалить выбранных", self)
+        self.remove_supplier_button.clicked.connect(self.remove_selected_suppliers)
+        quote_buttons_layout.addWidget(self.remove_supplier_button)
+        self.import_offers_button = QPushButton("Импорт предложений из папки", self)
+        self.import_offers_button.clicked.connect(self.import_offers_from_folder)
+        quote_buttons_layout.addWidget(self.import_offers_button)
+        quote_buttons_layout.addStretch()
+        self.exclude_outliers_checkbox = QCheckBox("Исключать выбросы при V > 33%", self)
+        quote_buttons_layout.addWidget(self.exclude_outliers_checkbox)
+        suppliers_layout.addLayout(quote_buttons_layout)
 
         suppliers_group.setLayout(suppliers_layout)
         main_layout.addWidget(suppliers_group)
 
+        # --- Текущий результат ---
+        live_group = QGroupBox("Текущий результат")
+        live_layout = QVBoxLayout()
+        self.live_checkbox = QCheckBox("Пересчитывать при вводе", self)
+        self.live_checkbox.setChecked(True)
+        self.live_checkbox.stateChanged.connect(self.schedule_live_recalc)
+        live_layout.addWidget(self.live_checkbox)
+        self.live_result_label = QLabel("Введите цены поставщиков", self)
+        live_layout.addWidget(self.live_result_label)
+        live_group.setLayout(live_layout)
+        main_layout.addWidget(live_group)
+
+        self.quantity_input.textChanged.connect(self.schedule_live_recalc)
+
+        # --- Позиции проекта ---
+        # Модель таблицы (вместе с numpy) создается при первом включении режима проекта
+        self.project_group = QGroupBox("Позиции проекта")
+        project_layout = QVBoxLayout()
+        subject_layout = QHBoxLayout()
+        subject_layout.addWidget(QLabel("Предмет договора:"))
+        self.project_subject_input = QLineEdit(self)
+        subject_layout.addWidget(self.project_subject_input)
+        self.open_project_button = QPushButton("Открыть проект", self)
+        self.open_project_button.clicked.connect(self.open_project_file)
+        subject_layout.addWidget(self.open_project_button)
+        self.save_project_file_button = QPushButton("Сохранить проект", self)
+        self.save_project_file_button.clicked.connect(self.save_project_file)
+        subject_layout.addWidget(self.save_project_file_button)
+        project_layout.addLayout(subject_layout)
+
+        self.project_table = QTableView(self)
+        # Редактор открывается по вводу или двойному щелчку, а не при переходе по ячейкам
+        self.project_table.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked
+                                           | QAbstractItemView.EditTrigger.EditKeyPressed
+                                           | QAbstractItemView.EditTrigger.AnyKeyPressed)
+        project_layout.addWidget(self.project_table)
+
+        project_buttons_layout = QHBoxLayout()
+        self.add_position_button = QPushButton("Добавить позицию", self)
+        self.add_position_button.clicked.connect(self.add_project_position)
+        project_buttons_layout.addWidget(self.add_position_button)
+        self.remove_positions_button = QPushButton("Удалить выбранные", self)
+        self.remove_positions_button.clicked.connect(self.remove_selected_positions)
+        project_buttons_layout.addWidget(self.remove_positions_button)
+        self.load_project_button = QPushButton("Загрузить из файла", self)
+        self.load_project_button.clicked.connect(self.load_project_from_file)
+        project_buttons_layout.addWidget(self.load_project_button)
+        self.save_project_button = QPushButton("Сохранить проект в Excel", self)
+        self.save_project_button.clicked.connect(self.save_project_to_excel)
+        project_buttons_layout.addWidget(self.save_project_button)
+        project_buttons_layout.addStretch()
+        self.project_total_label = QLabel("ИТОГО: 0.00", self)
+        project_buttons_layout.addWidget(self.project_total_label)
+        project_layout.addLayout(project_buttons_layout)
+
+        self.project_group.setLayout(project_layout)
+        self.project_group.setVisible(False)
+        main_layout.addWidget(self.project_group)
+
         # --- Кнопки ---
         button_layout = QHBoxLayout()
         self.calculate_button = QPushButton("Рассчитать НМЦД", self)
@@ -116,8 +212,21 @@ class NMCDCalculatorApp(QWidget):
         self.save_button.clicked.connect(self.save_to_excel)
         button_layout.addWidget(self.save_button)
 
+        self.batch_button = QPushButton("Пакетный расчет из файла", self)
+        self.batch_button.clicked.connect(self.batch_calculate_from_file)
+        button_layout.addWidget(self.batch_button)
+
+        self.project_checkbox = QCheckBox("Проект из нескольких позиций", self)
+        self.project_checkbox.toggled.connect(self.set_project_mode)
+        button_layout.addWidget(self.project_checkbox)
+
         main_layout.addLayout(button_layout)
 
+        # Кнопки, недоступные во время фоновой задачи
+        self.task_buttons = (self.calculate_button, self.save_button, self.batch_button, self.import_offers_button,
+                             self.load_project_button, self.save_project_button,
+                             self.open_project_button, self.save_project_file_button)
+
         self.setLayout(main_layout)
 
     def create_float_validator(self):
@@ -126,20 +235,145 @@ class NMCDCalculatorApp(QWidget):
         validator.setBottom(0.0)
         return validator
 
-    def toggle_supplier_fields(self, state, index):
-        enabled = bool(state)
-        self.supplier_name_inputs[index].setEnabled(enabled)
-        self.price_inputs[index].setEnabled(enabled)
-        self.price_labels[index].setEnabled(enabled)
+    def get_price_history(self):
+        if self.price_history is None:
+            import nmcd_history
+            self.price_history = nmcd_history.PriceHistory()
+        return self.price_history
 
-        if not enabled:
-            self.supplier_name_inputs[index].clear()
-            self.price_inputs[index].clear()
+    def update_item_completions(self, text):
+        if len(text.strip()) < HISTORY_MIN_PREFIX:
+            self.item_completions.setStringList([])
+            return
+        try:
+            self.item_completions.setStringList(self.get_price_history().find_items(text))
+        except Exception:
+            # Недоступная история не должна мешать вводу
+            self.item_completions.setStringList([])
+
+    def fill_from_history(self, item_name):
+        try:
+            found = self.get_price_history().latest_quotes(item_name)
+        except Exception as e:
+            QMessageBox.warning(self, "История цен", f"Не удалось прочитать историю цен: {e}")
+            return
+        if not found or not found[1]:
+            QMessageBox.information(self, "История цен", f"Для «{item_name}» нет сохраненных цен.")
+            return
+
+        # Подсказка выбирается и из выпадающего списка — введенные цены не
+        # заменяются без подтверждения
+        if self.quote_model.has_prices():
+            answer = QMessageBox.question(self, "История цен",
+                                          f"Заменить введенные цены предложениями из истории для «{item_name}»?")
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+
+        unit, quotes = found
+        if unit:
+            if self.unit_combo.findText(unit) < 0:
+                self.unit_combo.addItem(unit)
+            self.unit_combo.setCurrentText(unit)
+        self.quote_model.set_quotes(
+            (supplier, f"{price:.2f}".replace('.', ',')) for supplier, price, _ in quotes)
+
+    def import_offers_from_folder(self):
+        item_name = self.item_name_input.text().strip()
+        if not item_name:
+            QMessageBox.warning(self, "Ошибка ввода", "Пожалуйста, введите наименование предмета договора.")
+            return
+        folder = QFileDialog.getExistingDirectory(self, "Каталог с коммерческими предложениями поставщиков")
+        if not folder:
+            return
+
+        def load_quotes(quotes):
+            if not quotes["item_names"]:
+                QMessageBox.information(self, "Импорт предложений", f"В предложениях нет позиции «{item_name}».")
+                return
+            self.quote_model.set_quotes(
+                (supplier, f"{price:.2f}".replace('.', ','))
+                for supplier, price in zip(quotes["supplier_names"][0], quotes["prices"][0]))
+
+        task = nmcd_workers.Task(nmcd_workers.import_offers, folder, [item_name])
+        self.start_task(
+            task, "Импорт предложений...",
+            on_finished=load_quotes,
+            on_failed=lambda error: QMessageBox.critical(self, "Ошибка импорта", f"Ошибка: {error}"))
+
+    def add_supplier(self):
+        row = self.quote_model.add_quote()
+        index = self.quote_model.index(row, COLUMN_NAME)
+        self.quote_table.scrollTo(index)
+        self.quote_table.setCurrentIndex(index)
+        self.quote_table.edit(index)
+
+    def remove_selected_suppliers(self):
+        rows = sorted({index.row() for index in self.quote_table.selectionModel().selectedIndexes()}, reverse=True)
+        for row in rows:
+            self.quote_model.removeRows(row, 1)
+
+    def on_price_text_changed(self, row_id, text):
+        # Запоминается только последнее значение цены; применяется после паузы во вводе
+        self.pending_price_changes[row_id] = text
+        self.schedule_live_recalc()
+
+    def schedule_live_recalc(self):
+        if self.live_checkbox.isChecked():
+            self.live_timer.start()
+        else:
+            self.live_timer.stop()
+
+    @nmcd_profile.profiled("calculate.live")
+    def apply_live_changes(self):
+        import nmcd_core
+
+        if self.live_stats is None:
+            self.live_stats = nmcd_core.RunningStats()
+
+        # Каждое изменение — одна операция O(1) над накопителем
+        for row_id, text in self.pending_price_changes.items():
+            try:
+                new_price = self.parse_float_with_comma(text) if text else None
+            except ValueError:
+                new_price = None
+            old_price = self.live_prices.pop(row_id, None)
+            if new_price is not None:
+                self.live_prices[row_id] = new_price
+
+            if old_price is None and new_price is not None:
+                self.live_stats.add(new_price)
+            elif old_price is not None and new_price is None:
+                self.live_stats.remove(old_price)
+            elif old_price is not None and new_price != old_price:
+                self.live_stats.replace(old_price, new_price)
+        self.pending_price_changes.clear()
+
+        if self.live_stats.count == 0:
+            self.live_result_label.setText("Введите цены поставщиков")
+            self.live_result_label.setStyleSheet("")
+            return
+
+        try:
+            quantity = self.parse_float_with_comma(self.quantity_input.text())
+        except ValueError:
+            quantity = None
+        result = self.live_stats.result(quantity if quantity is not None else 0.0)
+
+        text = f"Цср: {result['avg_price']:.2f}   σ: {result['std_dev']:.2f}   V: {result['coeff_variation']:.2f}%"
+        text += f"   НМЦД: {result['nmcd_ryn']:.2f}" if quantity is not None else "   НМЦД: укажите количество"
+        if result["exceeds_limit"]:
+            text += f"\nКоэффициент вариации превышает {nmcd_core.COEFF_VARIATION_LIMIT}%"
+        self.live_result_label.setText(text)
+        self.live_result_label.setStyleSheet("color: #b00020;" if result["exceeds_limit"] else "")
 
     def parse_float_with_comma(self, text):
-        return float(text.replace(',', '.'))
+        import nmcd_core
+        return nmcd_core.parse_float_with_comma(text)
 
     def calculate_nmcd(self):
+        import nmcd_core
+        import nmcd_results
+
         try:
             item_name = self.item_name_input.text()
             if not item_name:
@@ -158,43 +392,49 @@ class NMCDCalculatorApp(QWidget):
 
             self.prices = []
             supplier_names_active = []
-            for i in range(5):
-                if self.supplier_checkboxes[i].isChecked():
-                    price_str = self.price_inputs[i].text()
-                    supplier_name = self.supplier_name_inputs[i].text()
-
+            with nmcd_profile.phase("calculate.parse"):
+                for number, supplier_name, price_str in self.quote_model.active_quotes():
                     if not supplier_name:
-                        QMessageBox.warning(self, "Ошибка ввода", f"Пожалуйста, введите наименование поставщика {i+1}.")
+                        QMessageBox.warning(self, "Ошибка ввода", f"Пожалуйста, введите наименование поставщика {number}.")
                         return
                     if not price_str:
-                        QMessageBox.warning(self, "Ошибка ввода", f"Пожалуйста, введите цену для поставщика {i+1}.")
+                        QMessageBox.warning(self, "Ошибка ввода", f"Пожалуйста, введите цену для поставщика {number}.")
                         return
-                    
+
                     self.prices.append(self.parse_float_with_comma(price_str))
                     supplier_names_active.append(supplier_name)
 
-            if len(self.prices) < 2:
-                if len(self.prices) == 1:
-                    QMessageBox.information(self, "Примечание", "Вы ввели данные только для одного поставщика. При закупке у единственного поставщика Заказчик вправе определить цену, равную наименьшему значению, полученному при анализе рынка.")
-                    nmcd_ryn = quantity * self.prices[0]
-                    avg_price = self.prices[0]
-                    s = 0.0
-                    V = 0.0
-                else:
-                    QMessageBox.warning(self, "Ошибка", "Для расчета требуется не менее двух цен от поставщиков.")
-                    return
-            else:
-                avg_price = sum(self.prices) / len(self.prices)
-                sum_sq_diff = sum([(p - avg_price)**2 for p in self.prices])
-                s = math.sqrt(sum_sq_diff / len(self.prices))
-
-                V = (s / avg_price) * 100 if avg_price != 0 else 0
-
-                nmcd_ryn = quantity * avg_price
+            if not self.prices:
+                QMessageBox.warning(self, "Ошибка", "Для расчета требуется не менее двух цен от поставщиков.")
+                return
+            if len(self.prices) == 1:
+                QMessageBox.information(self, "Примечание", "Вы ввели данные только для одного поставщика. При закупке у единственного поставщика Заказчик вправе определить цену, равную наименьшему значению, полученному при анализе рынка.")
+
+            with nmcd_profile.phase("calculate.stats", quotes=len(self.prices)):
+                result = nmcd_core.calculate_item(self.prices, quantity)
+
+            # Автоматический подбор наибольшего набора цен с V в пределах нормы
+            excluded = []
+            if result["exceeds_limit"] and self.exclude_outliers_checkbox.isChecked():
+                with nmcd_profile.phase("calculate.outliers", quotes=len(self.prices)):
+                    kept = set(nmcd_core.find_consistent_subset(self.prices).tolist())
+                    excluded = [(name, price) for i, (name, price) in enumerate(zip(supplier_names_active, self.prices))
+                                if i not in kept]
+                    supplier_names_active = [name for i, name in enumerate(supplier_names_active) if i in kept]
+                    self.prices = [price for i, price in enumerate(self.prices) if i in kept]
+                    result = nmcd_core.calculate_item(self.prices, quantity)
+
+            avg_price = result["avg_price"]
+            s = result["std_dev"]
+            V = result["coeff_variation"]
+            nmcd_ryn = result["nmcd_ryn"]
 
             coeff_variation_warning = ""
-            if V > 33:
-                coeff_variation_warning = f"Внимание: Коэффициент вариации ({V:.2f}%) превышает 33%. Рекомендуется провести дополнительные исследования."
+            if result["exceeds_limit"]:
+                coeff_variation_warning = f"Внимание: Коэффициент вариации ({V:.2f}%) превышает {nmcd_core.COEFF_VARIATION_LIMIT}%. Рекомендуется провести дополнительные исследования."
+            if excluded:
+                coeff_variation_warning = "Исключены предложения: " + \
+                    ", ".join(f"{name} ({price:.2f})" for name, price in excluded)
 
             result_text = f"Расчет НМЦД:\n" \
                           f"Среднее арифметическое цен: {avg_price:.2f}\n" \
@@ -204,18 +444,25 @@ class NMCDCalculatorApp(QWidget):
                           f"{coeff_variation_warning}"
             QMessageBox.information(self, "Результаты расчета", result_text)
 
-            self.calculated_data = {
-                "item_name": item_name,
-                "quantity": quantity,
-                "unit": unit,
-                "prices": self.prices,
-                "supplier_names": supplier_names_active,
-                "avg_price": avg_price,
-                "std_dev": s,
-                "coeff_variation": V,
-                "nmcd_ryn": nmcd_ryn,
-                "nmcd_date": nmcd_date
-            }
+            self.calculated_data = nmcd_results.ItemResult(
+                item_name=item_name,
+                quantity=quantity,
+                unit=unit,
+                prices=tuple(self.prices),
+                supplier_names=tuple(supplier_names_active),
+                excluded=tuple(excluded),
+                avg_price=avg_price,
+                std_dev=s,
+                coeff_variation=V,
+                nmcd_ryn=nmcd_ryn,
+                nmcd_date=nmcd_date
+            )
+
+            try:
+                with nmcd_profile.phase("calculate.history"):
+                    self.get_price_history().record_calculation(self.calculated_data)
+            except Exception as e:
+                QMessageBox.warning(self, "История цен", f"Не удалось сохранить цены в историю: {e}")
 
         except ValueError as ve:
             QMessageBox.critical(self, "Ошибка ввода", f"Пожалуйста, введите корректные числовые значения для количества и цен. Ошибка: {ve}")
@@ -229,7 +476,7 @@ class NMCDCalculatorApp(QWidget):
 
         try:
             data = self.calculated_data
-            suggested_file_name = f"Обоснование_НМЦД_{data['item_name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            suggested_file_name = f"Обоснование_НМЦД_{data.item_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
             
             file_path, _ = QFileDialog.getSaveFileName(self,
                                                        "Сохранить файл обоснования НМЦД",
@@ -239,195 +486,220 @@ class NMCDCalculatorApp(QWidget):
             if not file_path:
                 return
 
-            workbook = Workbook()
-            
-            # --- Лист 1: Обоснование НМЦК ---
-            sheet = workbook.active
-            sheet.title = "Обоснование НМЦК"
+            task = nmcd_workers.Task(nmcd_workers.export_justification, file_path, [data], data.nmcd_date, total=1)
+            self.start_task(
+                task, "Сохранение в Excel...",
+                on_finished=lambda _: QMessageBox.information(self, "Успех", f"Данные успешно сохранены в файл: {file_path}"),
+                on_failed=lambda error: QMessageBox.critical(self, "Ошибка сохранения", f"Не удалось сохранить файл Excel: {error}"))
 
-            thin_border = Border(left=Side(style='thin'), 
-                                 right=Side(style='thin'), 
-                                 top=Side(style='thin'), 
-                                 bottom=Side(style='thin'))
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка сохранения", f"Не удалось сохранить файл Excel: {e}")
 
-            row_offset = 1
+    def batch_calculate_from_file(self):
+        input_path, _ = QFileDialog.getOpenFileName(self,
+                                                    "Файл с позициями и ценами поставщиков",
+                                                    "",
+                                                    "Таблицы (*.csv *.xlsx)")
+        if not input_path:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Каталог для файлов обоснования НМЦД")
+        if not output_dir:
+            return
 
-            sheet.cell(row=row_offset, column=1, value="Заказчик:").font = Font(bold=True)
-            row_offset += 2
+        nmcd_date_qdate = self.date_nmcd.date()
+        nmcd_date = datetime(nmcd_date_qdate.year(), nmcd_date_qdate.month(), nmcd_date_qdate.day())
+
+        exclude_outliers = self.exclude_outliers_checkbox.isChecked()
+
+        def show_summary(result):
+            priced = int((result["count"] > 0).sum())
+            summary = (f"Рассчитано позиций: {priced} из {len(result['count'])}\n"
+                       f"Превышение коэффициента вариации: {int(result['exceeds_limit'].sum())}\n")
+            if "excluded" in result:
+                summary += f"Исключено предложений-выбросов: {result['excluded']}\n"
+            QMessageBox.information(self, "Пакетный расчет", summary + f"Файлы сохранены в каталог: {output_dir}")
+
+        task = nmcd_workers.Task(nmcd_workers.batch_calculate, input_path, output_dir, nmcd_date,
+                                 exclude_outliers=exclude_outliers)
+        self.start_task(
+            task, "Пакетный расчет...",
+            on_finished=show_summary,
+            on_failed=lambda error: QMessageBox.critical(self, "Ошибка пакетного расчета", f"Ошибка: {error}"))
+
+    def set_project_mode(self, enabled):
+        if enabled and self.project_model is None:
+            from nmcd_project_table import ProjectTableModel, ProjectDelegate, COLUMN_ITEM_NAME
+
+            self.project_model = ProjectTableModel(self)
+            self.project_model.set_exclude_outliers(self.exclude_outliers_checkbox.isChecked())
+            self.project_model.total_changed.connect(
+                lambda total: self.project_total_label.setText(f"ИТОГО: {total:.2f}"))
+            self.exclude_outliers_checkbox.toggled.connect(self.project_model.set_exclude_outliers)
+            self.project_table.setModel(self.project_model)
+            self.project_table.setItemDelegate(ProjectDelegate(self.project_table))
+            self.project_table.horizontalHeader().setSectionResizeMode(
+                COLUMN_ITEM_NAME, QHeaderView.ResizeMode.Stretch)
+        self.project_group.setVisible(enabled)
+
+    def add_project_position(self):
+        # Позиция добавляется из полей окна; цены можно дополнить прямо в таблице проекта
+        item_name = self.item_name_input.text().strip()
+        if not item_name:
+            QMessageBox.warning(self, "Ошибка ввода", "Пожалуйста, введите наименование предмета договора.")
+            return
+        quantity_str = self.quantity_input.text()
+        if not quantity_str:
+            QMessageBox.warning(self, "Ошибка ввода", "Пожалуйста, введите количество.")
+            return
 
-            header_text_part1 = "Обоснование начальной (максимальной) цены контракта / цены договора, заключаемого на"
-            sheet.merge_cells(start_row=row_offset, start_column=1, end_row=row_offset, end_column=12)
-            sheet.cell(row=row_offset, column=1, value=header_text_part1).font = Font(bold=True)
-            sheet.cell(row=row_offset, column=1).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            row_offset += 1
+        try:
+            quantity = self.parse_float_with_comma(quantity_str)
+            supplier_names, prices = [], []
+            for number, supplier_name, price_str in self.quote_model.active_quotes():
+                if price_str:
+                    supplier_names.append(supplier_name or f"Поставщик {number}")
+                    prices.append(self.parse_float_with_comma(price_str))
+        except ValueError as ve:
+            QMessageBox.critical(self, "Ошибка ввода", f"Пожалуйста, введите корректные числовые значения для количества и цен. Ошибка: {ve}")
+            return
 
-            sheet.merge_cells(start_row=row_offset, start_column=1, end_row=row_offset, end_column=12)
-            sheet.cell(row=row_offset, column=1, value=data['item_name']).font = Font(bold=True)
-            sheet.cell(row=row_offset, column=1).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            row_offset += 2
+        row = self.project_model.add_position(item_name, quantity, self.unit_combo.currentText(), supplier_names, prices)
+        index = self.project_model.index(row, 0)
+        self.project_table.scrollTo(index)
+        self.project_table.setCurrentIndex(index)
+
+    def remove_selected_positions(self):
+        rows = sorted({index.row() for index in self.project_table.selectionModel().selectedIndexes()}, reverse=True)
+        # Соседние строки удаляются одним блоком
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.project_model.removeRows(first, last - first + 1)
+
+    def load_project_from_file(self):
+        input_path, _ = QFileDialog.getOpenFileName(self,
+                                                    "Файл с позициями и ценами поставщиков",
+                                                    "",
+                                                    "Таблицы (*.csv *.xlsx)")
+        if not input_path:
+            return
 
-            legal_text = "Обоснование цены договора произведено методом сопоставимых рыночных цен (анализа рынка) с применением формул"
-            sheet.merge_cells(start_row=row_offset, start_column=1, end_row=row_offset, end_column=12)
-            sheet.cell(row=row_offset, column=1, value=legal_text).alignment = Alignment(wrap_text=True)
-            row_offset += 2
+        task = nmcd_workers.Task(nmcd_workers.load_project, input_path, self.exclude_outliers_checkbox.isChecked())
+        self.start_task(
+            task, "Загрузка позиций...",
+            on_finished=self.show_project,
+            on_failed=lambda error: QMessageBox.critical(self, "Ошибка загрузки", f"Ошибка: {error}"))
+
+    def show_project(self, project):
+        self.project_model.set_project(project)
+        self.show_project_file_name()
+
+    def show_project_file_name(self):
+        file_path = self.project_model.project.file_path
+        self.project_group.setTitle(
+            f"Позиции проекта — {os.path.basename(file_path)}" if file_path else "Позиции проекта")
+
+    def open_project_file(self):
+        import nmcd_project_file
+
+        file_path, _ = QFileDialog.getOpenFileName(self,
+                                                   "Открыть проект",
+                                                   "",
+                                                   f"Проект НМЦД (*{nmcd_project_file.FILE_EXTENSION})")
+        if not file_path:
+            return
 
-            sheet.merge_cells(start_row=row_offset, start_column=1, end_row=row_offset, end_column=12)
-            sheet.cell(row=row_offset, column=1, value="Расчет НМЦД методом сопоставимых рыночных цен (анализа рынка)").font = Font(bold=True)
-            row_offset += 1
+        task = nmcd_workers.Task(nmcd_workers.open_project, file_path, self.exclude_outliers_checkbox.isChecked())
+        self.start_task(
+            task, "Открытие проекта...",
+            on_finished=self.show_project,
+            on_failed=lambda error: QMessageBox.critical(self, "Ошибка открытия", f"Не удалось открыть проект: {error}"))
 
-            supplier_headers = [data["supplier_names"][i] if i < len(data["supplier_names"]) else f"Поставщик {i+1}" for i in range(3)]
-            
-            headers_row_main = [
-                "№ п/п",
-                "Наименование, основные характеристики объекта закупки",
-                "Количество товара, работы, услуги",
-                "ед. измерения",
-                supplier_headers[0],
-                supplier_headers[1],
-                supplier_headers[2],
-                "Среднеквадратичное отклонение",
-                "Коэффициент вариации (не должен превышать 33%)",
-                "Среднее арифметическое знач",
-                "Количество коммерческих предложений",
-                "НМЦД ТРУ"
-            ]
-            sheet.append(headers_row_main)
-            for col_idx in range(1, len(headers_row_main) + 1):
-                sheet.cell(row=row_offset, column=col_idx).border = thin_border
-                sheet.cell(row=row_offset, column=col_idx).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                sheet.cell(row=row_offset, column=col_idx).font = Font(bold=True, size=9)
-            
-            row_offset += 1
-
-            headers_row_nums = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "11", "12"]
-            sheet.append(headers_row_nums)
-            for col_idx in range(1, len(headers_row_nums) + 1):
-                sheet.cell(row=row_offset, column=col_idx).border = thin_border
-                sheet.cell(row=row_offset, column=col_idx).alignment = Alignment(horizontal='center', vertical='center')
-                sheet.cell(row=row_offset, column=col_idx).font = Font(size=9)
-            
-            row_offset += 1
-
-            row_data_values = [
-                1,
-                data["item_name"],
-                data["quantity"],
-                data["unit"],
-                data["prices"][0] if len(data["prices"]) > 0 else "",
-                data["prices"][1] if len(data["prices"]) > 1 else "",
-                data["prices"][2] if len(data["prices"]) > 2 else "",
-                f"{data['std_dev']:.2f}",
-                f"{data['coeff_variation']:.2f}%",
-                f"{data['avg_price']:.2f}",
-                len(data["prices"]),
-                f"{data['nmcd_ryn']:.2f}"
-            ]
-            sheet.append(row_data_values)
-            for col_idx in range(1, len(row_data_values) + 1):
-                sheet.cell(row=row_offset, column=col_idx).border = thin_border
-                sheet.cell(row=row_offset, column=col_idx).alignment = Alignment(horizontal='center', vertical='center')
-                sheet.cell(row=row_offset, column=col_idx).font = Font(size=9)
-            
-            row_offset += 1
-
-            sheet.append([])
-            row_offset += 1
-            total_row_values = ["ИТОГО:", "X", "Х", "", "", "", "", "Х", "", "Х", "Х", f"{data['nmcd_ryn']:.2f}"]
-            sheet.append(total_row_values)
-            sheet.cell(row=row_offset, column=1).font = Font(bold=True)
-            for col_idx in range(1, len(total_row_values) + 1):
-                sheet.cell(row=row_offset, column=col_idx).border = thin_border
-                sheet.cell(row=row_offset, column=col_idx).alignment = Alignment(horizontal='center', vertical='center')
-                sheet.cell(row=row_offset, column=col_idx).font = Font(bold=True, size=9)
-
-            row_offset += 2
-
-            sheet.cell(row=row_offset, column=1, value="Дата подготовки обоснования НМЦК:").font = Font(bold=True)
-            sheet.cell(row=row_offset, column=4, value=data["nmcd_date"].strftime("%d.%m.%Y")).font = Font(bold=True)
-            row_offset += 1
-            sheet.cell(row=row_offset, column=1, value="Ф. И. О. исполнителя:").font = Font(bold=True)
-            sheet.cell(row=row_offset, column=4, value="").font = Font(bold=True)
-            
-            sheet.column_dimensions['A'].width = 6
-            sheet.column_dimensions['B'].width = 30
-            sheet.column_dimensions['C'].width = 10
-            sheet.column_dimensions['D'].width = 12
-            sheet.column_dimensions['E'].width = 15
-            sheet.column_dimensions['F'].width = 15
-            sheet.column_dimensions['G'].width = 15
-            sheet.column_dimensions['H'].width = 18
-            sheet.column_dimensions['I'].width = 18
-            sheet.column_dimensions['J'].width = 18
-            sheet.column_dimensions['K'].width = 15
-            sheet.column_dimensions['L'].width = 15
-
-            sheet.page_setup.orientation = sheet.ORIENTATION_LANDSCAPE
-            sheet.page_setup.fitToPage = True
-            sheet.page_setup.fitToWidth = 1
-            sheet.page_setup.fitToHeight = 0
-
-            # --- Лист 2: Формулы расчета ---
-            formulas_sheet = workbook.create_sheet("Формулы расчета")
-            formulas_sheet.page_setup.orientation = formulas_sheet.ORIENTATION_PORTRAIT
-            formulas_sheet.page_setup.fitToPage = True
-            formulas_sheet.page_setup.fitToWidth = 1
-            formulas_sheet.page_setup.fitToHeight = 0
-
-
-            formulas_sheet.cell(row=1, column=1, value="Формулы расчета НМЦД").font = Font(bold=True, size=14)
-            formulas_sheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=4)
-            formulas_sheet.cell(row=1, column=1).alignment = Alignment(horizontal='center')
-
-            current_row = 3
-
-            # Среднее арифметическое цен
-            formulas_sheet.cell(row=current_row, column=1, value="1. Среднее арифметическое цен (Цср):").font = Font(bold=True)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="Цср = (Ц1 + Ц2 + ... + Цn) / n").font = Font(italic=True)
-            formulas_sheet.cell(row=current_row, column=1).alignment = Alignment(wrap_text=True)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="Где:").font = Font(bold=True)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="Цi - цена i-го коммерческого предложения").alignment = Alignment(indent=1)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="n - количество коммерческих предложений").alignment = Alignment(indent=1)
-            current_row += 2
-
-            # Среднеквадратичное отклонение
-            formulas_sheet.cell(row=current_row, column=1, value="2. Среднеквадратичное отклонение (σ):").font = Font(bold=True)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="σ = √[ Σ(Цi - Цср)² / n ]").font = Font(italic=True)
-            formulas_sheet.cell(row=current_row, column=1).alignment = Alignment(wrap_text=True)
-            current_row += 2
-
-            # Коэффициент вариации (с добавлением примечания)
-            formulas_sheet.cell(row=current_row, column=1, value="3. Коэффициент вариации (V):").font = Font(bold=True)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="V = (σ / Цср) * 100%").font = Font(italic=True)
-            formulas_sheet.cell(row=current_row, column=1).alignment = Alignment(wrap_text=True)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="Примечание: Коэффициент вариации не должен превышать 33%").font = Font(size=9, italic=True)
-            current_row += 2
-
-            # Расчет НМЦД
-            formulas_sheet.cell(row=current_row, column=1, value="4. Расчет начальной (максимальной) цены договора (НМЦД):").font = Font(bold=True)
-            current_row += 1
-            formulas_sheet.cell(row=current_row, column=1, value="НМЦД = Цср * Количество").font = Font(italic=True)
-            formulas_sheet.cell(row=current_row, column=1).alignment = Alignment(wrap_text=True)
-            current_row += 2
-
-            # Настройка ширины столбцов для листа с формулами
-            formulas_sheet.column_dimensions['A'].width = 70
-            formulas_sheet.column_dimensions['B'].width = 10
-            formulas_sheet.column_dimensions['C'].width = 10
-            formulas_sheet.column_dimensions['D'].width = 10
-
-            # --- Сохранение файла Excel ---
-            workbook.save(file_path)
-            QMessageBox.information(self, "Успех", f"Данные успешно сохранены в файл: {file_path}")
+    def save_project_file(self):
+        import nmcd_project_file
+
+        # Открытый из файла проект сохраняется в тот же файл: новые позиции
+        # и правки цен дописываются в его конец
+        file_path = self.project_model.project.file_path
+        if file_path is None:
+            file_path, _ = QFileDialog.getSaveFileName(self,
+                                                       "Сохранить проект",
+                                                       f"Проект_НМЦД{nmcd_project_file.FILE_EXTENSION}",
+                                                       f"Проект НМЦД (*{nmcd_project_file.FILE_EXTENSION})")
+            if not file_path:
+                return
 
+        try:
+            self.project_model.recalculate()
+            nmcd_project_file.save_project(file_path, self.project_model.project)
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка сохранения", f"Не удалось сохранить файл Excel: {e}")
+            QMessageBox.critical(self, "Ошибка сохранения", f"Не удалось сохранить проект: {e}")
+            return
+        self.show_project_file_name()
+
+    def save_project_to_excel(self):
+        self.project_model.recalculate()
+        project = self.project_model.project
+        priced = int((project.count > 0).sum())
+        if not priced:
+            QMessageBox.warning(self, "Предупреждение", "В проекте нет позиций с ценами поставщиков.")
+            return
+
+        suggested_file_name = f"Обоснование_НМЦД_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        file_path, _ = QFileDialog.getSaveFileName(self,
+                                                   "Сохранить файл обоснования НМЦД",
+                                                   suggested_file_name,
+                                                   "Excel Files (*.xlsx)")
+        if not file_path:
+            return
+
+        nmcd_date_qdate = self.date_nmcd.date()
+        nmcd_date = datetime(nmcd_date_qdate.year(), nmcd_date_qdate.month(), nmcd_date_qdate.day())
+        # Экспорт идет в фоне по копии, поэтому таблицу можно править дальше
+        table = project.to_table(nmcd_date)
+        task = nmcd_workers.Task(nmcd_workers.export_justification, file_path, table.priced(), nmcd_date,
+                                 total=priced, subject=self.project_subject_input.text(), supplier_names=(),
+                                 columns=project.columns)
+        self.start_task(
+            task, "Сохранение в Excel...",
+            on_finished=lambda _: QMessageBox.information(self, "Успех", f"Данные успешно сохранены в файл: {file_path}"),
+            on_failed=lambda error: QMessageBox.critical(self, "Ошибка сохранения", f"Не удалось сохранить файл Excel: {error}"))
+
+    def start_task(self, task, title, on_finished=None, on_failed=None):
+        # Задача выполняется в QThreadPool, окно остается отзывчивым;
+        # кнопки блокируются до ее завершения
+        progress_dialog = QProgressDialog(title, "Отмена", 0, 100, self)
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(300)
+        progress_dialog.setAutoClose(False)
+        progress_dialog.setAutoReset(False)
+        progress_dialog.canceled.connect(task.cancel)
+
+        def on_progress(percent, stage):
+            progress_dialog.setValue(percent)
+            if stage:
+                progress_dialog.setLabelText(f"{title}\n{stage}")
+
+        def on_done(*_):
+            progress_dialog.close()
+            self.active_task = None
+            for button in self.task_buttons:
+                button.setEnabled(True)
+
+        task.signals.progress.connect(on_progress)
+        # Диалог закрывается раньше, чем показываются сообщения о результате
+        for signal in (task.signals.finished, task.signals.failed, task.signals.cancelled):
+            signal.connect(on_done)
+        if on_finished is not None:
+            task.signals.finished.connect(on_finished)
+        if on_failed is not None:
+            task.signals.failed.connect(on_failed)
+
+        for button in self.task_buttons:
+            button.setEnabled(False)
+        self.active_task = task
+        QThreadPool.globalInstance().start(task)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
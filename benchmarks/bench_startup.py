@@ -0,0 +1,144 @@
+# =====================================================
+# Калькулятор НМЦД — замер времени запуска
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+#
+# Каждый замер выполняется в новом процессе интерпретатора:
+#   python benchmarks/bench_startup.py [--runs 5] [--max-import-ms 150] [--max-window-ms 600]
+# Код возврата 1 — превышен порог или тяжелый модуль загружается раньше времени.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которые не должны загружаться при импорте соответствующего модуля
+FORBIDDEN_IMPORTS = {
+    "NMCDCalculator": ("numpy", "openpyxl"),
+    "nmcd_core": ("PyQt6", "openpyxl"),
+}
+
+IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+WINDOW_PROBE = """
+import time
+start = time.perf_counter()
+import sys, json
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QTimer
+import NMCDCalculator
+
+app = QApplication(sys.argv)
+window = NMCDCalculator.NMCDCalculatorApp()
+window.show()
+
+def shown():
+    # Первая итерация цикла событий после show(): окно отрисовано
+    print(json.dumps({"seconds": time.perf_counter() - start}))
+    app.quit()
+
+QTimer.singleShot(0, shown)
+app.exec()
+"""
+
+
+def _run_probe(code):
+    env = dict(os.environ)
+    # Без дисплея (CI, сервер) окно создается на платформе offscreen
+    if sys.platform.startswith("linux") and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    wall = time.perf_counter() - start
+    return json.loads(output.strip().splitlines()[-1]), wall
+
+
+def measure_import(module, runs):
+    times, walls = [], []
+    leaked = set()
+    for _ in range(runs):
+        data, wall = _run_probe(IMPORT_PROBE.format(module=module))
+        times.append(data["seconds"])
+        walls.append(wall)
+        for forbidden in FORBIDDEN_IMPORTS.get(module, ()):
+            if forbidden in data["modules"]:
+                leaked.add(forbidden)
+    return {
+        "name": f"import {module}",
+        "ms": statistics.median(times) * 1000,
+        "process_ms": statistics.median(walls) * 1000,
+        "leaked": sorted(leaked),
+    }
+
+
+def measure_window(runs):
+    times, walls = [], []
+    for _ in range(runs):
+        data, wall = _run_probe(WINDOW_PROBE)
+        times.append(data["seconds"])
+        walls.append(wall)
+    return {
+        "name": "first window shown",
+        "ms": statistics.median(times) * 1000,
+        "process_ms": statistics.median(walls) * 1000,
+        "leaked": [],
+    }
+
+
+def run(runs=5, window=True):
+    results = [measure_import(module, runs) for module in ("nmcd_core", "NMCDCalculator")]
+    if window:
+        results.append(measure_window(runs))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер времени запуска калькулятора НМЦД.")
+    parser.add_argument("--runs", type=int, default=5, help="количество запусков (берется медиана)")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="порог времени импорта NMCDCalculator, мс")
+    parser.add_argument("--max-window-ms", type=float, default=None,
+                        help="порог времени до показа окна, мс")
+    parser.add_argument("--no-window", action="store_true", help="не замерять показ окна")
+    parser.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.runs, window=not args.no_window)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            print(f"{result['name']:<24} {result['ms']:8.1f} мс  (процесс целиком {result['process_ms']:.1f} мс)")
+
+    failed = False
+    for result in results:
+        if result["leaked"]:
+            print(f"{result['name']}: загружены лишние модули: {', '.join(result['leaked'])}", file=sys.stderr)
+            failed = True
+    limits = {"import NMCDCalculator": args.max_import_ms, "first window shown": args.max_window_ms}
+    for result in results:
+        limit = limits.get(result["name"])
+        if limit is not None and result["ms"] > limit:
+            print(f"{result['name']}: {result['ms']:.1f} мс превышает порог {limit:.1f} мс", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
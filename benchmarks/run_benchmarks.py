@@ -0,0 +1,252 @@
+# =====================================================
+# Калькулятор НМЦД — набор замеров производительности
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+#
+#   python benchmarks/run_benchmarks.py                        # все замеры
+#   python benchmarks/run_benchmarks.py --quick                # без самых больших объемов
+#   python benchmarks/run_benchmarks.py --save-baseline base.json
+#   python benchmarks/run_benchmarks.py --compare base.json --tolerance 0.2
+#
+# Каждый замер выполняется в отдельном процессе, чтобы пиковый объем
+# памяти (RSS) относился только к нему. Данные генерируются с
+# фиксированным зерном, поэтому прогоны воспроизводимы.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED = 20240101
+
+# (группа, параметры, единица пропускной способности)
+CASES = [
+    ("core", (1, 5), "позиций"),
+    ("core", (1000, 20), "позиций"),
+    ("core", (10000, 50), "позиций"),
+    ("core", (100000, 200), "позиций"),
+    ("export", (1,), "строк"),
+    ("export", (1000,), "строк"),
+    ("export", (10000,), "строк"),
+    ("export", (50000,), "строк"),
+    ("formulas", (), "листов"),
+]
+QUICK_LIMITS = {"core": 10000, "export": 10000}
+
+# Минимальная суммарная длительность повторов для быстрых замеров, с
+MIN_TOTAL_SECONDS = 0.5
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS — байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timed(fn):
+    # Повторы до MIN_TOTAL_SECONDS, в результат — лучшее время
+    times = []
+    while not times or (sum(times) < MIN_TOTAL_SECONDS and len(times) < 100):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _quotes(items, suppliers):
+    import numpy as np
+
+    rng = np.random.default_rng(SEED)
+    prices = rng.uniform(100.0, 200.0, size=(items, suppliers))
+    # Примерно у каждой десятой позиции часть предложений отсутствует
+    prices[rng.random(size=(items, suppliers)) < 0.1] = np.nan
+    quantities = rng.integers(1, 100, size=items).astype(np.float64)
+    return prices, quantities
+
+
+def bench_core(items, suppliers):
+    import numpy as np
+    import nmcd_core
+
+    prices, quantities = _quotes(items, suppliers)
+    if items == 1:
+        row = prices[0][~np.isnan(prices[0])].tolist()
+        seconds = _timed(lambda: nmcd_core.calculate_item(row, quantities[0]))
+    else:
+        seconds = _timed(lambda: nmcd_core.calculate_batch(prices, quantities))
+    return seconds, items
+
+
+def bench_export(rows):
+    import nmcd_core
+    import nmcd_excel
+    import nmcd_results
+
+    prices, quantities = _quotes(rows, 5)
+    result = nmcd_core.calculate_batch(prices, quantities)
+    quotes = {
+        "item_names": [f"Позиция {i + 1}" for i in range(rows)],
+        "quantities": quantities,
+        "units": ["шт"] * rows,
+        "supplier_names": [[f"Поставщик {j + 1}" for j in range(5)]] * rows,
+        "prices": prices,
+    }
+    table = nmcd_results.ResultTable(quotes, result)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.xlsx")
+        seconds = _timed(lambda: nmcd_excel.save_justification(
+            path, iter(table), datetime(2024, 1, 1), columns=5))
+    return seconds, rows
+
+
+def bench_formulas():
+    import io
+    import nmcd_excel
+
+    def build():
+        workbook = nmcd_excel.new_workbook()
+        nmcd_excel.write_formulas_sheet(workbook)
+        workbook.save(io.BytesIO())
+
+    return _timed(build), 1
+
+
+BENCHES = {"core": bench_core, "export": bench_export, "formulas": bench_formulas}
+
+
+def case_name(group, params):
+    return group if not params else f"{group}[{'x'.join(str(p) for p in params)}]"
+
+
+def run_case(group, params, unit):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", group, *map(str, params)],
+        cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    data = json.loads(output.strip().splitlines()[-1])
+    seconds, count = data["seconds"], data["count"]
+    return {
+        "name": case_name(group, params),
+        "seconds": seconds,
+        "throughput": count / seconds if seconds else None,
+        "unit": unit,
+        "peak_rss_mb": data["peak_rss_mb"],
+    }
+
+
+def run_startup(runs):
+    import bench_startup
+
+    results = []
+    for result in bench_startup.run(runs):
+        results.append({
+            "name": f"startup[{result['name']}]",
+            "seconds": result["ms"] / 1000,
+            "throughput": None,
+            "unit": "",
+            "peak_rss_mb": None,
+        })
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Возвращает строки отчета и признак регрессии
+    previous = {result["name"]: result for result in baseline["results"]}
+    lines, regressed = [], False
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None or not old["seconds"]:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "  <-- медленнее"
+            regressed = True
+        lines.append(f"{result['name']:<36} {old['seconds'] * 1000:10.2f} -> {result['seconds'] * 1000:10.2f} мс"
+                     f"  x{ratio:.2f}{mark}")
+    return lines, regressed
+
+
+def print_results(results):
+    print(f"{'Замер':<36} {'Время, мс':>12} {'Пропускная способность':>28} {'Пик RSS, МБ':>12}")
+    for result in results:
+        throughput = f"{result['throughput']:,.0f} {result['unit']}/с" if result["throughput"] else "-"
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{result['name']:<36} {result['seconds'] * 1000:12.2f} {throughput:>28} {rss:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности калькулятора НМЦД.")
+    parser.add_argument("--quick", action="store_true", help="пропустить самые большие объемы")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHES) + ["startup"],
+                        help="выполнить только указанные группы")
+    parser.add_argument("--startup-runs", type=int, default=5, help="запусков при замере старта")
+    parser.add_argument("--save-baseline", metavar="FILE", help="сохранить результаты как базовые")
+    parser.add_argument("--compare", metavar="FILE", help="сравнить с сохраненными базовыми результатами")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="допустимое замедление относительно базы (0.2 = 20%%)")
+    parser.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        group, params = args.child[0], [int(p) for p in args.child[1:]]
+        seconds, count = BENCHES[group](*params)
+        print(json.dumps({"seconds": seconds, "count": count, "peak_rss_mb": _peak_rss_mb()}))
+        return 0
+
+    groups = set(args.only or list(BENCHES) + ["startup"])
+    results = []
+    for group, params, unit in CASES:
+        if group not in groups:
+            continue
+        if args.quick and params and params[0] > QUICK_LIMITS.get(group, params[0]):
+            continue
+        results.append(run_case(group, params, unit))
+    if "startup" in groups:
+        results.extend(run_startup(args.startup_runs))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.tolerance)
+        print()
+        print(f"Сравнение с базой от {baseline.get('created', '?')}:")
+        for line in lines:
+            print(line)
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
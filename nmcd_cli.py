@@ -0,0 +1,367 @@
+# =====================================================
+# Калькулятор НМЦД — пакетный расчет из командной строки
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import argparse
+import csv
+import math
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+import nmcd_core
+import nmcd_excel
+import nmcd_profile
+import nmcd_results
+
+# Допустимые заголовки столбцов входного файла (без учета регистра)
+COLUMN_ALIASES = {
+    "item_name": ("наименование", "наименование предмета договора", "item", "item_name"),
+    "quantity": ("количество", "quantity"),
+    "unit": ("ед. измерения", "ед.изм.", "unit"),
+    "supplier": ("поставщик", "supplier"),
+    "price": ("цена", "price"),
+}
+REQUIRED_COLUMNS = ("item_name", "price")
+
+DEFAULT_UNIT = "усл.ед"
+DEFAULT_CHUNK_SIZE = 500
+
+
+def iter_csv_rows(path):
+    """Строки CSV-файла; разделитель («;», «,» или табуляция) определяется по началу файла."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _iter_xlsx_rows(path):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _map_columns(header):
+    normalized = [str(value).strip().lower() if value is not None else "" for value in header]
+    columns = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for index, title in enumerate(normalized):
+            if title in aliases:
+                columns[key] = index
+                break
+    missing = [key for key in REQUIRED_COLUMNS if key not in columns]
+    if missing:
+        raise ValueError("Во входном файле нет обязательных столбцов: "
+                         + ", ".join(COLUMN_ALIASES[key][0] for key in missing))
+    return columns
+
+
+def row_field(row, columns, key):
+    """Значение столбца key строки (columns — номера столбцов по ключам);
+    "" для отсутствующего столбца или пустой ячейки, текст без пробелов по краям."""
+    index = columns.get(key)
+    if index is None or index >= len(row) or row[index] is None:
+        return ""
+    value = row[index]
+    return value.strip() if isinstance(value, str) else value
+
+
+def _to_float(value):
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        number = nmcd_core.parse_float_with_comma(str(value).strip())
+    # Как и в полях окна, допустимы только конечные неотрицательные числа
+    if not math.isfinite(number) or number < 0:
+        raise ValueError(f"некорректное число {value!r}")
+    return number
+
+
+def read_quotes(path):
+    """Чтение позиций и предложений поставщиков из CSV или XLSX.
+
+    Файл содержит по строке на каждое предложение: наименование, количество,
+    ед. измерения, поставщик, цена. Строки одной позиции объединяются по
+    наименованию в порядке первого появления.
+
+    Возвращает словарь со списками item_names, quantities, units,
+    supplier_names и матрицей цен prices (NaN — нет предложения).
+    """
+    with nmcd_profile.phase("batch.read", path=os.path.basename(path)) as read_phase:
+        quotes = _read_quotes(path)
+        if nmcd_profile.enabled:
+            read_phase.add(items=len(quotes["item_names"]), quotes=int((~np.isnan(quotes["prices"])).sum()))
+    return quotes
+
+
+def _read_quotes(path):
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        rows = _iter_xlsx_rows(path)
+    else:
+        rows = iter_csv_rows(path)
+
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("Входной файл пуст.")
+    columns = _map_columns(header)
+
+    index_by_name = {}
+    item_names, quantities, units, suppliers, prices = [], [], [], [], []
+    for line_number, row in enumerate(rows, start=2):
+        item_name = str(row_field(row, columns, "item_name"))
+        price = row_field(row, columns, "price")
+        if not item_name and price == "":
+            continue
+        if not item_name:
+            raise ValueError(f"Строка {line_number}: не указано наименование.")
+
+        index = index_by_name.get(item_name)
+        if index is None:
+            quantity = row_field(row, columns, "quantity")
+            try:
+                quantity = _to_float(quantity) if quantity != "" else 1.0
+            except ValueError:
+                raise ValueError(f"Строка {line_number}: некорректное количество «{quantity}».")
+            index = index_by_name[item_name] = len(item_names)
+            item_names.append(item_name)
+            quantities.append(quantity)
+            units.append(str(row_field(row, columns, "unit")) or DEFAULT_UNIT)
+            suppliers.append([])
+            prices.append([])
+
+        if price == "":
+            continue
+        try:
+            prices[index].append(_to_float(price))
+        except ValueError:
+            raise ValueError(f"Строка {line_number}: некорректная цена «{price}».")
+        suppliers[index].append(str(row_field(row, columns, "supplier")) or f"Поставщик {len(prices[index])}")
+
+    return quotes_from_lists(item_names, quantities, units, suppliers, prices)
+
+
+def quotes_from_lists(item_names, quantities, units, supplier_names, prices):
+    """Позиции в формате read_quotes из списков по позициям.
+
+    prices — списки цен разной длины; матрица дополняется NaN до самого
+    длинного из них.
+    """
+    width = max((len(p) for p in prices), default=0)
+    matrix = np.full((len(prices), width), np.nan)
+    for row, item_prices in enumerate(prices):
+        matrix[row, :len(item_prices)] = item_prices
+    return {
+        "item_names": item_names,
+        "quantities": np.asarray(quantities, dtype=np.float64),
+        "units": units,
+        "supplier_names": supplier_names,
+        "prices": matrix,
+    }
+
+
+def _safe_file_name(text):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', text).strip('_')[:80]
+
+
+def _process_chunk(start, item_names, quantities, units, supplier_names, prices, nmcd_date, output_dir,
+                   exclude_outliers=False):
+    # Выполняется в процессе-исполнителе: расчет блока позиций и, при
+    # необходимости, отдельная книга на каждую позицию
+    with nmcd_profile.phase("batch.chunk", start=start, items=len(item_names)):
+        with nmcd_profile.phase("batch.stats", items=len(item_names), outliers=exclude_outliers):
+            mask = nmcd_core.exclude_outliers(prices) if exclude_outliers else None
+            result = nmcd_core.calculate_batch(prices, quantities, mask=mask)
+        if mask is not None:
+            result["included"] = mask
+        if output_dir is not None:
+            chunk = {"item_names": item_names, "quantities": quantities, "units": units,
+                     "supplier_names": supplier_names, "prices": prices}
+            for data in nmcd_results.ResultTable(chunk, result, nmcd_date).priced():
+                file_name = f"{start + data.index + 1:05d}_Обоснование_НМЦД_{_safe_file_name(data.item_name)}.xlsx"
+                nmcd_excel.save_justification(os.path.join(output_dir, file_name), [data], nmcd_date)
+    return start, result
+
+
+@nmcd_profile.profiled("batch.calculate")
+def calculate(quotes, nmcd_date, output_dir=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+              progress=None, exclude_outliers=False, mp_context=None):
+    """Расчет всех позиций блоками по chunk_size в пуле процессов.
+
+    Если указан output_dir, исполнители сразу пишут по книге на позицию.
+    При exclude_outliers из позиций с V > 33% исключаются выбросы, а в
+    результат добавляется маска учтенных предложений "included".
+    progress(готово, всего) вызывается по завершении каждого блока;
+    исключение из нее отменяет оставшиеся блоки. mp_context — способ
+    запуска процессов-исполнителей (multiprocessing.get_context), по
+    умолчанию — стандартный для платформы.
+    Возвращает объединенный результат calculate_batch.
+    """
+    count = len(quotes["item_names"])
+    chunks = [
+        (start,
+         quotes["item_names"][start:start + chunk_size],
+         quotes["quantities"][start:start + chunk_size],
+         quotes["units"][start:start + chunk_size],
+         quotes["supplier_names"][start:start + chunk_size],
+         quotes["prices"][start:start + chunk_size],
+         nmcd_date,
+         output_dir,
+         exclude_outliers)
+        for start in range(0, count, chunk_size)
+    ]
+
+    done = 0
+    if workers == 1 or len(chunks) <= 1:
+        parts = []
+        for chunk in chunks:
+            parts.append(_process_chunk(*chunk))
+            done += len(chunk[1])
+            if progress is not None:
+                progress(done, count)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+            futures = [executor.submit(_process_chunk, *chunk) for chunk in chunks]
+            try:
+                for future in as_completed(futures):
+                    done += len(future.result()[1]["count"])
+                    if progress is not None:
+                        progress(done, count)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            # Блоки собираются в исходном порядке, а не в порядке завершения
+            parts = [future.result() for future in futures]
+
+    keys = ("count", "avg_price", "std_dev", "coeff_variation", "exceeds_limit", "nmcd_ryn")
+    if exclude_outliers:
+        keys += ("included",)
+    if not parts:
+        # Пустые массивы тех же типов, что и у calculate_batch, маска — по форме матрицы цен
+        empty = {key: np.empty(0) for key in keys}
+        empty["count"] = np.empty(0, dtype=np.intp)
+        empty["exceeds_limit"] = np.empty(0, dtype=bool)
+        if exclude_outliers:
+            empty["included"] = np.empty(np.shape(quotes["prices"]), dtype=bool)
+        return empty
+    return {key: np.concatenate([result[key] for _, result in parts]) for key in keys}
+
+
+def parse_date(text):
+    """Дата вида ДД.ММ.ГГГГ или ГГГГ-ММ-ДД; ValueError для другого текста."""
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"некорректная дата: {text} (ожидается ДД.ММ.ГГГГ)")
+
+
+def _date_argument(text):
+    try:
+        return parse_date(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="nmcd_cli",
+        description="Пакетный расчет НМЦД методом сопоставимых рыночных цен.")
+    parser.add_argument("input", help="CSV или XLSX: наименование, количество, ед. измерения, поставщик, цена; "
+                                      "или каталог с файлами коммерческих предложений поставщиков")
+    parser.add_argument("-o", "--output", required=True,
+                        help="каталог для книг по позициям или файл .xlsx для общей книги")
+    parser.add_argument("--combined", action="store_true",
+                        help="записать все позиции в одну книгу обоснования")
+    parser.add_argument("--subject", help="наименование предмета договора для общей книги")
+    parser.add_argument("--date", type=_date_argument, default=None,
+                        help="дата подготовки обоснования (по умолчанию — сегодня)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="количество процессов (по умолчанию — по числу ядер)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="позиций в одном задании для процесса")
+    parser.add_argument("--items", metavar="FILE",
+                        help="при импорте каталога — учитывать только позиции из FILE (по строке на позицию)")
+    parser.add_argument("--exclude-outliers", action="store_true",
+                        help="при V > 33%% исключать выбросы, оставляя наибольший согласованный набор цен")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="записывать время этапов в FILE (JSON по строке на этап, \"-\" — stderr)")
+    parser.add_argument("--cprofile", metavar="DIR",
+                        help="сохранять в DIR дампы cProfile для каждого этапа верхнего уровня")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size должен быть положительным")
+    nmcd_date = args.date or datetime.combine(datetime.now().date(), datetime.min.time())
+    if args.profile or args.cprofile:
+        nmcd_profile.configure(args.profile or os.environ.get(nmcd_profile.PROFILE_ENV),
+                               args.cprofile or os.environ.get(nmcd_profile.CPROFILE_ENV))
+
+    try:
+        if os.path.isdir(args.input):
+            import nmcd_import
+
+            item_names = None
+            if args.items:
+                with open(args.items, encoding="utf-8-sig") as f:
+                    item_names = [line.strip() for line in f if line.strip()]
+            quotes = nmcd_import.import_offers(args.input, item_names, workers=args.workers)
+        else:
+            quotes = read_quotes(args.input)
+        if args.combined:
+            result = calculate(quotes, nmcd_date, workers=args.workers, chunk_size=args.chunk_size,
+                               exclude_outliers=args.exclude_outliers)
+            table = nmcd_results.ResultTable(quotes, result, nmcd_date)
+            with nmcd_profile.phase("export", items=int((result["count"] > 0).sum())):
+                nmcd_excel.save_justification(
+                    args.output, table.priced(), nmcd_date,
+                    subject=args.subject or "", supplier_names=(), columns=quotes["prices"].shape[1])
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            result = calculate(quotes, nmcd_date, output_dir=args.output,
+                               workers=args.workers, chunk_size=args.chunk_size,
+                               exclude_outliers=args.exclude_outliers)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    priced = result["count"] > 0
+    print(f"Позиций: {len(priced)}, рассчитано: {int(priced.sum())}")
+    print(f"НМЦД итого: {np.nansum(result['nmcd_ryn']):.2f}")
+    exceeded = int(result["exceeds_limit"].sum())
+    if exceeded:
+        print(f"Коэффициент вариации превышает {nmcd_core.COEFF_VARIATION_LIMIT}%: {exceeded} поз.")
+    if "included" in result:
+        excluded = int((~np.isnan(quotes["prices"]) & ~result["included"]).sum())
+        print(f"Исключено предложений-выбросов: {excluded}")
+    skipped = len(priced) - int(priced.sum())
+    if skipped:
+        print(f"Пропущено без цен: {skipped} поз.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
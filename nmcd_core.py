@@ -0,0 +1,223 @@
+# =====================================================
+# Калькулятор НМЦД — расчетное ядро (без GUI)
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import math
+
+import numpy as np
+
+# Предельное значение коэффициента вариации, %
+COEFF_VARIATION_LIMIT = 33
+
+
+def parse_float_with_comma(text):
+    return float(text.replace(',', '.'))
+
+
+def calculate_batch(prices, quantities=None, mask=None):
+    """Расчет НМЦД сразу для всех позиций.
+
+    prices — матрица цен «позиции × поставщики»; отсутствующее
+    предложение задается NaN или значением False в mask.
+    quantities — количество по каждой позиции (по умолчанию 1).
+
+    Возвращает словарь массивов длиной по числу позиций. Для позиций
+    без единого предложения среднее и НМЦД равны NaN.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.ndim == 1:
+        prices = prices[np.newaxis, :]
+    if prices.ndim != 2:
+        raise ValueError("Матрица цен должна быть двумерной (позиции × поставщики).")
+
+    valid = ~np.isnan(prices)
+    if mask is not None:
+        valid &= np.asarray(mask, dtype=bool)
+
+    if quantities is None:
+        quantities = np.ones(prices.shape[0])
+    else:
+        quantities = np.broadcast_to(np.asarray(quantities, dtype=np.float64), prices.shape[:1])
+
+    count = valid.sum(axis=1)
+    filled = np.where(valid, prices, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_price = filled.sum(axis=1) / count
+        # Отклонения считаются только по заполненным ячейкам
+        deviations = np.where(valid, filled - avg_price[:, np.newaxis], 0.0)
+        std_dev = np.sqrt(np.einsum('ij,ij->i', deviations, deviations) / count)
+        coeff_variation = np.where(avg_price != 0, std_dev / avg_price * 100, 0.0)
+
+    # Позиции без предложений не должны давать NaN в σ и V
+    empty = count == 0
+    std_dev[empty] = 0.0
+    coeff_variation[empty] = 0.0
+
+    return {
+        "count": count,
+        "avg_price": avg_price,
+        "std_dev": std_dev,
+        "coeff_variation": coeff_variation,
+        "exceeds_limit": coeff_variation > COEFF_VARIATION_LIMIT,
+        "nmcd_ryn": quantities * avg_price,
+    }
+
+
+def calculate_item(prices, quantity):
+    """Расчет НМЦД по одной позиции — обертка над calculate_batch."""
+    if len(prices) == 0:
+        raise ValueError("Для расчета требуется хотя бы одна цена.")
+
+    result = calculate_batch([prices], quantities=[quantity])
+    return {
+        "count": int(result["count"][0]),
+        "avg_price": float(result["avg_price"][0]),
+        "std_dev": float(result["std_dev"][0]),
+        "coeff_variation": float(result["coeff_variation"][0]),
+        "exceeds_limit": bool(result["exceeds_limit"][0]),
+        "nmcd_ryn": float(result["nmcd_ryn"][0]),
+    }
+
+
+def find_consistent_subset(prices, limit=COEFF_VARIATION_LIMIT):
+    """Наибольший набор цен с коэффициентом вариации не выше limit.
+
+    Кандидатами служат непрерывные окна отсортированных цен: для каждого
+    размера окна, начиная с полного набора, σ и V всех окон считаются
+    разом по префиксным суммам цен и их квадратов. Первый размер, при
+    котором есть подходящее окно, — ответ; из окон этого размера берется
+    окно с наименьшим V. Если не подходит ни одна пара, остается
+    наименьшая цена.
+
+    Возвращает отсортированные индексы оставляемых цен в исходном массиве.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    count = len(prices)
+    if count <= 1:
+        return np.arange(count)
+
+    order = np.argsort(prices, kind='stable')
+    sorted_prices = prices[order]
+    # Сдвиг к медиане уменьшает потерю точности в сумме квадратов
+    pivot = sorted_prices[count // 2]
+    shifted = sorted_prices - pivot
+    sums = np.concatenate(([0.0], np.cumsum(shifted)))
+    squares = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+
+    for size in range(count, 1, -1):
+        mean_shifted = (sums[size:] - sums[:-size]) / size
+        variance = np.maximum((squares[size:] - squares[:-size]) / size - mean_shifted ** 2, 0.0)
+        mean = mean_shifted + pivot
+        with np.errstate(invalid='ignore', divide='ignore'):
+            coeff_variation = np.where(mean != 0, np.sqrt(variance) / mean * 100, 0.0)
+        candidates = np.flatnonzero(coeff_variation <= limit)
+        if candidates.size:
+            start = candidates[np.argmin(coeff_variation[candidates])]
+            return np.sort(order[start:start + size])
+
+    return order[:1]
+
+
+def exclude_outliers(prices, mask=None, limit=COEFF_VARIATION_LIMIT):
+    """Маска учитываемых предложений после исключения выбросов.
+
+    Для позиций, где V превышает limit, остается только наибольший
+    согласованный набор (find_consistent_subset); остальные позиции
+    не меняются. Исключенные предложения — valid & ~маска.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.ndim == 1:
+        prices = prices[np.newaxis, :]
+    valid = ~np.isnan(prices)
+    if mask is not None:
+        valid &= np.asarray(mask, dtype=bool)
+
+    keep = valid.copy()
+    exceeded = calculate_batch(prices, mask=valid)["coeff_variation"] > limit
+    for row in np.flatnonzero(exceeded):
+        columns = np.flatnonzero(valid[row])
+        subset = find_consistent_subset(prices[row, columns], limit)
+        keep[row, columns] = False
+        keep[row, columns[subset]] = True
+    return keep
+
+
+class RunningStats:
+    """Онлайн-расчет среднего и σ по Уэлфорду.
+
+    Добавление, удаление и замена одной цены выполняются за O(1), поэтому
+    при правке одного предложения пересчитывать весь набор не нужно.
+    """
+
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self, prices=()):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        for price in prices:
+            self.add(price)
+
+    def add(self, price):
+        self.count += 1
+        delta = price - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (price - self.mean)
+
+    def remove(self, price):
+        if self.count <= 1:
+            if self.count == 0:
+                raise ValueError("Нет цен для удаления.")
+            self.count = 0
+            self.mean = 0.0
+            self._m2 = 0.0
+            return
+        mean = (self.count * self.mean - price) / (self.count - 1)
+        self._m2 -= (price - self.mean) * (price - mean)
+        # Погрешность округления не должна давать отрицательную дисперсию,
+        # а для одной оставшейся цены накопленная погрешность сбрасывается
+        self._m2 = max(self._m2, 0.0) if self.count > 2 else 0.0
+        self.mean = mean
+        self.count -= 1
+
+    def replace(self, old_price, new_price):
+        if self.count == 0:
+            raise ValueError("Нет цен для замены.")
+        if self.count == 1:
+            # Единственная цена — она же среднее, разброса нет
+            self.mean = float(new_price)
+            self._m2 = 0.0
+            return
+        delta = new_price - old_price
+        mean = self.mean + delta / self.count
+        self._m2 += delta * (new_price - mean + old_price - self.mean)
+        self._m2 = max(self._m2, 0.0)
+        self.mean = mean
+
+    @property
+    def std_dev(self):
+        return math.sqrt(self._m2 / self.count) if self.count else 0.0
+
+    @property
+    def coeff_variation(self):
+        return self.std_dev / self.mean * 100 if self.count and self.mean != 0 else 0.0
+
+    def result(self, quantity):
+        """Результат в формате calculate_item."""
+        if self.count == 0:
+            raise ValueError("Для расчета требуется хотя бы одна цена.")
+        coeff_variation = self.coeff_variation
+        return {
+            "count": self.count,
+            "avg_price": self.mean,
+            "std_dev": self.std_dev,
+            "coeff_variation": coeff_variation,
+            "exceeds_limit": coeff_variation > COEFF_VARIATION_LIMIT,
+            "nmcd_ryn": quantity * self.mean,
+        }
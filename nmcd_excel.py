@@ -0,0 +1,424 @@
+# =====================================================
+# Калькулятор НМЦД — экспорт обоснования в Excel
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import functools
+import io
+import itertools
+import json
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from openpyxl.workbook import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Font, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+
+import nmcd_profile
+
+SHEET_TITLE = "Обоснование НМЦК"
+FORMULAS_SHEET_TITLE = "Формулы расчета"
+
+# Минимальное количество столбцов с ценами поставщиков в таблице обоснования
+SUPPLIER_COLUMNS = 3
+
+# Как часто (в позициях) сообщать о ходе экспорта
+PROGRESS_STEP = 200
+
+# Строки листа обоснования копятся в памяти до этого объема, дальше — во временном файле
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Стили, которые используются на листе обоснования
+JUSTIFICATION_STYLES = ("НМЦД: жирный", "НМЦД: заголовок", "НМЦД: перенос",
+                        "НМЦД: шапка таблицы", "НМЦД: ячейка", "НМЦД: итого")
+
+HEADER_TEXT = "Обоснование начальной (максимальной) цены контракта / цены договора, заключаемого на"
+LEGAL_TEXT = "Обоснование цены договора произведено методом сопоставимых рыночных цен (анализа рынка) с применением формул"
+TABLE_TITLE = "Расчет НМЦД методом сопоставимых рыночных цен (анализа рынка)"
+EXCLUSIONS_TITLE = "Исключены из расчета предложения (коэффициент вариации превышал 33%):"
+SUPPLIERS_TITLE = "Поставщики по позициям (в порядке столбцов «Предложение»):"
+
+# Ширина столбцов до цен, каждого столбца цены и после цен
+LEADING_COLUMN_WIDTHS = [6, 30, 10, 12]
+PRICE_COLUMN_WIDTH = 15
+TRAILING_COLUMN_WIDTHS = [18, 18, 18, 15, 15]
+FORMULAS_COLUMN_WIDTHS = {'A': 70, 'B': 10, 'C': 10, 'D': 10}
+
+# Содержимое листа «Формулы расчета»: (строка, текст, стиль)
+FORMULAS_ROWS = [
+    (1, "Формулы расчета НМЦД", "НМЦД: заголовок формул"),
+    # Среднее арифметическое цен
+    (3, "1. Среднее арифметическое цен (Цср):", "НМЦД: жирный"),
+    (4, "Цср = (Ц1 + Ц2 + ... + Цn) / n", "НМЦД: формула"),
+    (5, "Где:", "НМЦД: жирный"),
+    (6, "Цi - цена i-го коммерческого предложения", "НМЦД: пояснение"),
+    (7, "n - количество коммерческих предложений", "НМЦД: пояснение"),
+    # Среднеквадратичное отклонение
+    (9, "2. Среднеквадратичное отклонение (σ):", "НМЦД: жирный"),
+    (10, "σ = √[ Σ(Цi - Цср)² / n ]", "НМЦД: формула"),
+    # Коэффициент вариации (с добавлением примечания)
+    (12, "3. Коэффициент вариации (V):", "НМЦД: жирный"),
+    (13, "V = (σ / Цср) * 100%", "НМЦД: формула"),
+    (14, "Примечание: Коэффициент вариации не должен превышать 33%", "НМЦД: примечание"),
+    # Расчет НМЦД
+    (16, "4. Расчет начальной (максимальной) цены договора (НМЦД):", "НМЦД: жирный"),
+    (17, "НМЦД = Цср * Количество", "НМЦД: формула"),
+]
+
+
+def _create_named_styles():
+    thin = Side(style='thin')
+    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    return [
+        NamedStyle("НМЦД: жирный", font=Font(bold=True)),
+        NamedStyle("НМЦД: заголовок", font=Font(bold=True),
+                   alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)),
+        NamedStyle("НМЦД: перенос", alignment=Alignment(wrap_text=True)),
+        NamedStyle("НМЦД: шапка таблицы", font=Font(bold=True, size=9), border=thin_border,
+                   alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)),
+        NamedStyle("НМЦД: ячейка", font=Font(size=9), border=thin_border,
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        NamedStyle("НМЦД: итого", font=Font(bold=True, size=9), border=thin_border,
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        NamedStyle("НМЦД: заголовок формул", font=Font(bold=True, size=14),
+                   alignment=Alignment(horizontal='center')),
+        NamedStyle("НМЦД: формула", font=Font(italic=True), alignment=Alignment(wrap_text=True)),
+        NamedStyle("НМЦД: пояснение", alignment=Alignment(indent=1)),
+        NamedStyle("НМЦД: примечание", font=Font(size=9, italic=True)),
+    ]
+
+
+def column_widths(columns=SUPPLIER_COLUMNS):
+    return LEADING_COLUMN_WIDTHS + [PRICE_COLUMN_WIDTH] * columns + TRAILING_COLUMN_WIDTHS
+
+
+def supplier_headers(supplier_names, columns=SUPPLIER_COLUMNS):
+    if not supplier_names:
+        # У позиций разные поставщики: столбец — порядковый номер предложения в строке
+        return [f"Предложение {i+1}" for i in range(columns)]
+    return [supplier_names[i] if i < len(supplier_names) else f"Поставщик {i+1}" for i in range(columns)]
+
+
+def header_row(supplier_names, columns=SUPPLIER_COLUMNS):
+    return [
+        "№ п/п",
+        "Наименование, основные характеристики объекта закупки",
+        "Количество товара, работы, услуги",
+        "ед. измерения",
+        *supplier_headers(supplier_names, columns),
+        "Среднеквадратичное отклонение",
+        "Коэффициент вариации (не должен превышать 33%)",
+        "Среднее арифметическое знач",
+        "Количество коммерческих предложений",
+        "НМЦД ТРУ"
+    ]
+
+
+def item_row(number, data, columns=SUPPLIER_COLUMNS):
+    prices = data.prices
+    return [
+        number,
+        data.item_name,
+        data.quantity,
+        data.unit,
+        *[prices[i] if i < len(prices) else "" for i in range(columns)],
+        f"{data.std_dev:.2f}",
+        f"{data.coeff_variation:.2f}%",
+        f"{data.avg_price:.2f}",
+        len(prices),
+        f"{data.nmcd_ryn:.2f}"
+    ]
+
+
+def total_row(total, columns=SUPPLIER_COLUMNS):
+    return ["ИТОГО:", "X", "Х", "", *[""] * columns, "Х", "", "Х", "Х", f"{total:.2f}"]
+
+
+def exclusion_note(number, data, excluded):
+    excluded = ", ".join(f"{supplier or 'без названия'} ({price:.2f})" for supplier, price in excluded)
+    return f"{number}. {data.item_name}: {excluded}"
+
+
+def supplier_note(number, data):
+    suppliers = ", ".join(supplier or "без названия" for supplier in data.supplier_names)
+    return f"{number}. {data.item_name}: {suppliers}"
+
+
+class _Notes:
+    """Пояснения под таблицей. Номера их строк известны только после
+    итога, поэтому до него пояснения копятся во временном буфере
+    (крупный — на диске), по строке JSON на пояснение."""
+
+    def __init__(self):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode="w+", encoding="utf-8")
+        self.count = 0
+
+    def add(self, text):
+        self.file.write(json.dumps(text, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def __iter__(self):
+        self.file.seek(0)
+        return (json.loads(line) for line in self.file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+
+def new_workbook():
+    """Пустая write-only книга с зарегистрированными стилями обоснования."""
+    workbook = Workbook(write_only=True)
+    for style in _create_named_styles():
+        workbook.add_named_style(style)
+    return workbook
+
+
+def write_formulas_sheet(workbook):
+    """Лист «Формулы расчета» в книге, созданной new_workbook()."""
+    formulas_sheet = workbook.create_sheet(FORMULAS_SHEET_TITLE)
+    for letter, width in FORMULAS_COLUMN_WIDTHS.items():
+        formulas_sheet.column_dimensions[letter].width = width
+    formulas_sheet.page_setup.orientation = 'portrait'
+    formulas_sheet.page_setup.fitToPage = True
+    formulas_sheet.page_setup.fitToWidth = 1
+    formulas_sheet.page_setup.fitToHeight = 0
+    formulas_sheet.merged_cells.add("A1:D1")
+
+    current_row = 1
+    for row, text, style in FORMULAS_ROWS:
+        while current_row < row:
+            formulas_sheet.append([])
+            current_row += 1
+        cell = WriteOnlyCell(formulas_sheet, value=text)
+        cell.style = style
+        formulas_sheet.append([cell])
+        current_row += 1
+
+
+# Пустой элемент данных листа: openpyxl пишет <sheetData></sheetData>,
+# другие версии могут сократить его до <sheetData/>
+_EMPTY_SHEET_DATA = re.compile(r"<sheetData\s*/>|<sheetData>\s*</sheetData>")
+
+
+def split_sheet_xml(sheet_xml):
+    """XML пустого листа до и после строк: (начало с <sheetData>, конец с </sheetData>) в UTF-8."""
+    parts = _EMPTY_SHEET_DATA.split(sheet_xml)
+    if len(parts) != 2:
+        raise RuntimeError("Не удалось построить шаблон книги обоснования: "
+                           "в листе, сохраненном openpyxl, не найден пустой элемент sheetData.")
+    head, tail = parts
+    return (head + "<sheetData>").encode("utf-8"), ("</sheetData>" + tail).encode("utf-8")
+
+
+class JustificationTemplate:
+    """Неизменная часть книги обоснования для заданного числа столбцов цен.
+
+    Стили, лист «Формулы расчета», ширина столбцов, объединенные ячейки
+    и параметры печати один раз формируются средствами openpyxl. Затем
+    из готового файла берутся все части, кроме строк листа обоснования.
+    При экспорте эти части копируются как есть, а XML строк с данными
+    пишется напрямую, с индексами стилей из шаблона.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.letters = [get_column_letter(i) for i in range(1, len(column_widths(columns)) + 1)]
+
+        workbook = new_workbook()
+        sheet = workbook.create_sheet(SHEET_TITLE)
+        for letter, width in zip(self.letters, column_widths(columns)):
+            sheet.column_dimensions[letter].width = width
+        sheet.page_setup.orientation = 'landscape'
+        sheet.page_setup.fitToPage = True
+        sheet.page_setup.fitToWidth = 1
+        sheet.page_setup.fitToHeight = 0
+        for row in (3, 4, 6, 8):
+            sheet.merged_cells.add(f"A{row}:{self.letters[-1]}{row}")
+
+        # Индексы стилей ячеек (атрибут s) регистрируются в книге до сохранения
+        self.style_ids = {}
+        for style in JUSTIFICATION_STYLES:
+            cell = WriteOnlyCell(sheet)
+            cell.style = style
+            self.style_ids[style] = cell.style_id
+        write_formulas_sheet(workbook)
+
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        with zipfile.ZipFile(buffer) as archive:
+            self.parts = [(info.filename, archive.read(info)) for info in archive.infolist()]
+        self.sheet_path = sheet.path.lstrip("/")
+        sheet_xml = dict(self.parts)[self.sheet_path].decode("utf-8")
+        self.parts = [(name, data) for name, data in self.parts if name != self.sheet_path]
+        self.sheet_head, self.sheet_tail = split_sheet_xml(sheet_xml)
+
+        # Строки над таблицей не зависят от позиций, кроме предмета договора
+        self.rows_before_subject = self.row_xml(1, [("Заказчик:", "НМЦД: жирный")]) + \
+            self.row_xml(3, [(HEADER_TEXT, "НМЦД: заголовок")])
+        self.rows_after_subject = self.row_xml(6, [(LEGAL_TEXT, "НМЦД: перенос")]) + \
+            self.row_xml(8, [(TABLE_TITLE, "НМЦД: жирный")])
+        self.numbers_row = self.row_xml(
+            10, [(str(i), "НМЦД: ячейка") for i in range(1, len(self.letters) + 1)])
+
+    def cell_xml(self, reference, value, style=None):
+        style_attribute = f' s="{self.style_ids[style]}"' if style else ""
+        if value is None or value == "":
+            return f'<c r="{reference}"{style_attribute}/>' if style else ""
+        if isinstance(value, str):
+            text = ILLEGAL_CHARACTERS_RE.sub("", value)
+            space = ' xml:space="preserve"' if text.strip() and text != text.strip() else ""
+            return f'<c r="{reference}"{style_attribute} t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+        if isinstance(value, bool):
+            return f'<c r="{reference}"{style_attribute} t="b"><v>{int(value)}</v></c>'
+        number = "%.16g" % value
+        if number in ("nan", "inf", "-inf"):
+            return f'<c r="{reference}"{style_attribute}/>' if style else ""
+        return f'<c r="{reference}"{style_attribute} t="n"><v>{number}</v></c>'
+
+    def row_xml(self, number, cells):
+        """XML строки number из пар (значение, стиль) по столбцам начиная с A."""
+        content = "".join(self.cell_xml(f"{letter}{number}", value, style)
+                          for letter, (value, style) in zip(self.letters, cells))
+        return f'<row r="{number}">{content}</row>' if content else ""
+
+    def core_properties(self):
+        # Время создания книги — время экспорта, а не построения шаблона
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        data = dict(self.parts)["docProps/core.xml"].decode("utf-8")
+        data = re.sub(r"(<dcterms:(created|modified)[^>]*>)[^<]*", lambda m: m.group(1) + now, data)
+        return data.encode("utf-8")
+
+
+@functools.lru_cache(maxsize=16)
+def justification_template(columns=SUPPLIER_COLUMNS):
+    """Шаблон книги для columns столбцов цен; строится один раз на процесс."""
+    return JustificationTemplate(max(columns, SUPPLIER_COLUMNS))
+
+
+def save_justification(file_path, items, nmcd_date, subject=None, supplier_names=None,
+                       columns=None, progress=None):
+    """Потоковая запись обоснования НМЦД на основе шаблона книги.
+
+    items — итерируемый объект (в том числе генератор) результатов
+    nmcd_results.ItemResult или строк nmcd_results.ResultTable. Строки по мере поступления пишутся во временный
+    буфер (крупный — на диске), поэтому расход памяти не зависит от
+    количества позиций. Неизменная часть книги берется из
+    justification_template и не строится заново при каждом экспорте.
+
+    file_path — путь или открытый двоичный файл. subject — наименование
+    предмета договора для заголовка, по умолчанию берется из первой
+    позиции; supplier_names — подписи столбцов с ценами, по умолчанию —
+    поставщики первой позиции. Пустой supplier_names — для общей книги
+    позиций с разными поставщиками: столбцы называются «Предложение 1»,
+    «Предложение 2»..., а поставщики каждой позиции перечисляются под
+    таблицей. columns — количество столбцов с ценами (не
+    меньше SUPPLIER_COLUMNS); по умолчанию — по числу цен первой позиции,
+    поэтому для нескольких позиций его следует передавать явно.
+
+    progress — необязательная функция, которой каждые PROGRESS_STEP строк
+    передается количество записанных позиций; исключение из нее прерывает
+    экспорт до создания файла.
+
+    При включенных замерах (nmcd_profile) формирование листа и сохранение
+    книги записываются как этапы export.build и export.save с количеством
+    строк, ячеек и стилей.
+    """
+    items = iter(items)
+    first = next(items, None)
+    if first is None:
+        raise ValueError("Нет позиций для экспорта.")
+    if subject is None:
+        subject = first.item_name
+    if supplier_names is None:
+        supplier_names = first.supplier_names
+    if columns is None:
+        columns = len(first.prices)
+    template = justification_template(max(columns, SUPPLIER_COLUMNS))
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as rows:
+        with nmcd_profile.phase("export.build") as build_phase:
+            total, counts = _write_justification_rows(
+                rows, template, first, items, nmcd_date, subject, supplier_names, progress)
+            build_phase.add(**counts)
+        with nmcd_profile.phase("export.save", rows=counts["rows"]):
+            size = rows.tell() + len(template.sheet_head) + len(template.sheet_tail)
+            rows.seek(0)
+            with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                with archive.open(template.sheet_path, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as sheet:
+                    sheet.write(template.sheet_head)
+                    shutil.copyfileobj(rows, sheet)
+                    sheet.write(template.sheet_tail)
+                for name, data in template.parts:
+                    archive.writestr(name, template.core_properties() if name == "docProps/core.xml" else data)
+    return total
+
+
+def _write_justification_rows(output, template, first, items, nmcd_date, subject, supplier_names, progress):
+    columns = template.columns
+    # Пять строк заголовка по одной ячейке и две строки шапки таблицы
+    header_cells = 5 + 2 * len(template.letters)
+    counts = {"rows": 0, "cells": header_cells, "styled_cells": header_cells, "styles": len(template.style_ids)}
+    row_number = 10
+
+    def append(values, style=None):
+        nonlocal row_number
+        row_number += 1
+        if values:
+            output.write(template.row_xml(row_number, [(value, style) for value in values]).encode("utf-8"))
+            counts["cells"] += len(values)
+            if style:
+                counts["styled_cells"] += len(values)
+
+    output.write((template.rows_before_subject
+                  + template.row_xml(4, [(subject, "НМЦД: заголовок")])
+                  + template.rows_after_subject
+                  + template.row_xml(9, [(value, "НМЦД: шапка таблицы")
+                                         for value in header_row(supplier_names, columns)])
+                  + template.numbers_row).encode("utf-8"))
+
+    total = 0.0
+    # Под таблицей перечисляются поставщики позиций, если у столбцов цен нет
+    # общих подписей, и исключенные предложения
+    with _Notes() as supplier_notes, _Notes() as exclusion_notes:
+        for number, data in enumerate(itertools.chain([first], items), start=1):
+            append(item_row(number, data, columns), "НМЦД: ячейка")
+            counts["rows"] = number
+            total += data.nmcd_ryn
+            if not supplier_names:
+                supplier_notes.add(supplier_note(number, data))
+            excluded = data.excluded
+            if excluded:
+                exclusion_notes.add(exclusion_note(number, data, excluded))
+            if progress is not None and number % PROGRESS_STEP == 0:
+                progress(number)
+
+        append([])
+        append(total_row(total, columns), "НМЦД: итого")
+        append([])
+        for title, notes in ((SUPPLIERS_TITLE, supplier_notes), (EXCLUSIONS_TITLE, exclusion_notes)):
+            if notes.count:
+                append([title], "НМЦД: жирный")
+                for note in notes:
+                    append([note])
+                append([])
+    row_number += 1
+    output.write(template.row_xml(row_number, [
+        ("Дата подготовки обоснования НМЦК:", "НМЦД: жирный"), (None, None), (None, None),
+        (nmcd_date.strftime("%d.%m.%Y"), "НМЦД: жирный")]).encode("utf-8"))
+    counts["cells"] += 2
+    counts["styled_cells"] += 2
+    append(["Ф. И. О. исполнителя:"], "НМЦД: жирный")
+    return total, counts
@@ -0,0 +1,147 @@
+# =====================================================
+# Калькулятор НМЦД — локальная история цен (SQLite)
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import os
+import re
+import sqlite3
+
+# Путь к базе можно переопределить переменной окружения
+HISTORY_PATH_ENV = "NMCD_HISTORY_DB"
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".nmcd_calculator", "history.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL UNIQUE,
+    unit TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL REFERENCES items(id),
+    supplier TEXT NOT NULL,
+    price REAL NOT NULL,
+    quote_date TEXT NOT NULL,
+    UNIQUE (item_id, supplier, price, quote_date)
+);
+CREATE INDEX IF NOT EXISTS quotes_item_date ON quotes(item_id, quote_date);
+CREATE INDEX IF NOT EXISTS quotes_date ON quotes(quote_date);
+"""
+
+# Полнотекстовый индекс по наименованиям; если SQLite собран без FTS5,
+# остается поиск по началу наименования
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(name, content='items', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts(rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+
+def normalize_item_name(name):
+    return " ".join(name.split()).casefold()
+
+
+def default_history_path():
+    return os.environ.get(HISTORY_PATH_ENV) or DEFAULT_HISTORY_PATH
+
+
+class PriceHistory:
+    """Хранилище ранее использованных предложений поставщиков.
+
+    Наименования позиций хранятся один раз в таблице items с уникальным
+    нормализованным ключом, предложения — в quotes с индексами по
+    позиции и дате, поэтому поиск и подстановка не зависят от общего
+    числа сохраненных цен.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_history_path()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False
+
+    def close(self):
+        self.connection.close()
+
+    def _item_id(self, name, unit):
+        key = normalize_item_name(name)
+        row = self.connection.execute("SELECT id FROM items WHERE name_key = ?", (key,)).fetchone()
+        if row is not None:
+            self.connection.execute("UPDATE items SET unit = ? WHERE id = ?", (unit, row[0]))
+            return row[0]
+        return self.connection.execute(
+            "INSERT INTO items(name, name_key, unit) VALUES (?, ?, ?)", (" ".join(name.split()), key, unit)).lastrowid
+
+    def record(self, item_name, unit, quotes, quote_date):
+        """Сохранение предложений [(поставщик, цена), ...] на дату quote_date.
+
+        Повторное сохранение того же предложения на ту же дату игнорируется.
+        """
+        with self.connection:
+            item_id = self._item_id(item_name, unit)
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO quotes(item_id, supplier, price, quote_date) VALUES (?, ?, ?, ?)",
+                [(item_id, supplier, price, quote_date.strftime("%Y-%m-%d")) for supplier, price in quotes])
+
+    def record_calculation(self, data):
+        """Сохранение результата расчета (nmcd_results.ItemResult).
+
+        Исключенные из расчета предложения тоже сохраняются — это
+        действительные цены поставщиков.
+        """
+        quotes = list(zip(data.supplier_names, data.prices)) + list(data.excluded)
+        self.record(data.item_name, data.unit, quotes, data.nmcd_date)
+
+    def find_items(self, text, limit=20):
+        """Наименования, начинающиеся с text, а при наличии FTS5 — также
+        содержащие слова, начинающиеся с введенных слов."""
+        key = normalize_item_name(text)
+        if not key:
+            return []
+        # Диапазон по уникальному индексу name_key вместо LIKE
+        names = [row[0] for row in self.connection.execute(
+            "SELECT name FROM items WHERE name_key >= ? AND name_key < ? ORDER BY name_key LIMIT ?",
+            (key, key + "\uffff", limit))]
+        if self.full_text and len(names) < limit:
+            words = re.findall(r"\w+", text)
+            if words:
+                query = " ".join(f'"{word}"*' for word in words)
+                for (name,) in self.connection.execute(
+                        "SELECT name FROM items_fts WHERE items_fts MATCH ? ORDER BY rank LIMIT ?",
+                        (query, limit)):
+                    if name not in names:
+                        names.append(name)
+                        if len(names) >= limit:
+                            break
+        return names
+
+    def latest_quotes(self, item_name):
+        """Последнее предложение каждого поставщика по позиции.
+
+        Возвращает (ед. измерения, [(поставщик, цена, дата), ...]) или None.
+        """
+        row = self.connection.execute(
+            "SELECT id, unit FROM items WHERE name_key = ?", (normalize_item_name(item_name),)).fetchone()
+        if row is None:
+            return None
+        item_id, unit = row
+        # Из нескольких цен поставщика на последнюю дату берется записанная позже
+        quotes = self.connection.execute(
+            "SELECT supplier, price, quote_date FROM quotes AS q WHERE item_id = ? AND id = ("
+            "SELECT id FROM quotes WHERE item_id = q.item_id AND supplier = q.supplier "
+            "ORDER BY quote_date DESC, id DESC LIMIT 1) ORDER BY supplier", (item_id,)).fetchall()
+        return unit, quotes
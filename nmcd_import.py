@@ -0,0 +1,219 @@
+# =====================================================
+# Калькулятор НМЦД — импорт коммерческих предложений из каталога
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import nmcd_profile
+from nmcd_cli import COLUMN_ALIASES, DEFAULT_UNIT, iter_csv_rows, quotes_from_lists, row_field
+from nmcd_history import normalize_item_name
+
+OFFER_EXTENSIONS = (".xlsx", ".xlsm", ".csv")
+
+# Шапка таблицы ищется среди первых строк листа: выше нее обычно
+# реквизиты поставщика и текст предложения
+HEADER_SEARCH_ROWS = 30
+
+# Заголовки столбцов в предложениях поставщиков разнообразнее, чем во
+# входном файле пакетного расчета
+OFFER_COLUMN_ALIASES = {
+    "item_name": COLUMN_ALIASES["item_name"] + (
+        "наименование товара", "наименование товара, работы, услуги", "наименование продукции",
+        "товар", "номенклатура"),
+    "quantity": COLUMN_ALIASES["quantity"] + ("кол-во",),
+    "unit": COLUMN_ALIASES["unit"] + ("ед. изм.", "ед.", "единица измерения"),
+    "supplier": COLUMN_ALIASES["supplier"] + ("наименование поставщика", "организация"),
+    "price": COLUMN_ALIASES["price"] + ("цена за единицу", "цена за ед.", "цена с ндс", "unit price"),
+}
+
+# Цена — вся ячейка: число с необязательными разделителями разрядов и
+# дробной частью, за ним может стоять обозначение рубля. Пробелы (в том
+# числе неразрывные) удаляются заранее
+_PRICE_PATTERN = re.compile(
+    r"(?P<whole>\d{1,3}(?P<sep>[.,])\d{3}(?:(?P=sep)\d{3})*|\d+)(?:(?P<point>[.,])(?P<fraction>\d+))?"
+    r"(?:руб\.?|рублей|р\.?|₽|rub\.?)?", re.IGNORECASE)
+
+# Строки итогов под таблицей: «Итого», «Всего к оплате», «В т.ч. НДС 20%» и т. п.
+_TOTAL_PATTERN = re.compile(r"(?:итого|всего|в\s*т\.\s*ч\.|в том числе|сумма ндс|ндс)(?!\w)")
+
+
+def find_offer_files(folder):
+    """Файлы предложений в каталоге (без вложенных), по алфавиту."""
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(OFFER_EXTENSIONS) and not name.startswith("~$")
+        and os.path.isfile(os.path.join(folder, name)))
+
+
+def _title_matches(title, alias):
+    # «Цена, руб.» и «Цена (с НДС)» подходят к «цена», «Наименование поставщика» к «наименование» — нет
+    return title == alias or title.startswith((alias + ",", alias + " ("))
+
+
+def match_offer_header(row):
+    """Номера столбцов по заголовкам или None, если это не шапка таблицы."""
+    titles = [str(value).strip().lower() if value is not None else "" for value in row]
+    columns = {}
+    for key, aliases in OFFER_COLUMN_ALIASES.items():
+        for index, title in enumerate(titles):
+            if title and index not in columns.values() and any(_title_matches(title, alias) for alias in aliases):
+                columns[key] = index
+                break
+    if "item_name" not in columns or "price" not in columns:
+        return None
+    return columns
+
+
+def parse_offer_price(value):
+    """Цена из ячейки предложения: число или текст вида «1 234,50 руб.».
+
+    Возвращает None, если в ячейке не цена: пустая ячейка, примечание
+    вроде «по запросу (от 5 шт.)», дата, отрицательное или бесконечное
+    значение.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        price = float(value)
+    elif isinstance(value, str):
+        match = _PRICE_PATTERN.fullmatch(re.sub(r"\s", "", value))
+        if match is None:
+            return None
+        whole, separator, point, fraction = match.group("whole", "sep", "point", "fraction")
+        if separator is not None and point is None and whole.count(separator) == 1:
+            # «1.234» и «1,234» — десятичная дробь, как у float()
+            whole, fraction = whole.split(separator)
+        elif separator is not None and point == separator:
+            # «1.234.5» — разделитель разрядов не бывает десятичным
+            return None
+        elif separator is not None:
+            # «1.234,50», «1,234.50», «1.234.567»
+            whole = whole.replace(separator, "")
+        price = float(f"{whole}.{fraction or 0}")
+    else:
+        # Даты и прочие значения ячеек ценой не считаются
+        return None
+    return price if math.isfinite(price) and price >= 0 else None
+
+
+def _iter_offer_sheets(path):
+    # Строки каждого листа читаются потоково, файл целиком в память не загружается;
+    # CSV разбирается так же, как входной файл пакетного расчета
+    if path.lower().endswith(".csv"):
+        yield iter_csv_rows(path)
+        return
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_offer_file(path, item_keys=None):
+    """Предложения из одного файла: [(ключ, наименование, ед. изм.,
+    количество, поставщик, цена), ...].
+
+    Поставщик берется из столбца «Поставщик», а если его нет — из имени
+    файла. Если задан item_keys (нормализованные наименования), остальные
+    позиции отбрасываются сразу при чтении. Строки итогов («Итого»,
+    «Всего», «В т.ч. НДС») пропускаются. Для каждой пары «позиция —
+    поставщик» сохраняется первое предложение.
+    """
+    default_supplier = os.path.splitext(os.path.basename(path))[0]
+    quotes = {}
+    with nmcd_profile.phase("import.file", file=os.path.basename(path)) as file_phase:
+        for rows in _iter_offer_sheets(path):
+            columns = None
+            for number, row in enumerate(rows, start=1):
+                if columns is None:
+                    columns = match_offer_header(row)
+                    if columns is None and number >= HEADER_SEARCH_ROWS:
+                        break
+                    continue
+                item_name = str(row_field(row, columns, "item_name"))
+                if not item_name or _TOTAL_PATTERN.match(item_name.lower()):
+                    continue
+                key = normalize_item_name(item_name)
+                if item_keys is not None and key not in item_keys:
+                    continue
+                price = parse_offer_price(row_field(row, columns, "price"))
+                if price is None:
+                    continue
+                supplier = str(row_field(row, columns, "supplier")) or default_supplier
+                if (key, supplier) not in quotes:
+                    quotes[(key, supplier)] = (key, " ".join(item_name.split()), str(row_field(row, columns, "unit")),
+                                               parse_offer_price(row_field(row, columns, "quantity")), supplier, price)
+        file_phase.add(quotes=len(quotes))
+    return list(quotes.values())
+
+
+def import_offers(folder, item_names=None, workers=None, progress=None, mp_context=None):
+    """Импорт всех предложений из каталога в формате nmcd_cli.read_quotes.
+
+    Файлы разбираются параллельно в пуле процессов; в основной процесс
+    возвращаются только найденные предложения, поэтому расход памяти
+    определяется их количеством, а не размером прайс-листов. item_names —
+    необязательный список нужных позиций: тогда результат содержит
+    только их и в том же порядке. progress(готово, всего) вызывается по
+    завершении каждого файла; исключение из нее отменяет оставшиеся.
+    mp_context — способ запуска процессов, как в nmcd_cli.calculate.
+    """
+    paths = find_offer_files(folder)
+    if not paths:
+        raise ValueError(f"В каталоге нет файлов предложений ({', '.join(OFFER_EXTENSIONS)}).")
+    item_keys = None
+    if item_names is not None:
+        item_keys = {normalize_item_name(name) for name in item_names}
+
+    with nmcd_profile.phase("import", files=len(paths)):
+        results = {}
+        if workers == 1 or len(paths) == 1:
+            for path in paths:
+                results[path] = read_offer_file(path, item_keys)
+                if progress is not None:
+                    progress(len(results), len(paths))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+                futures = {executor.submit(read_offer_file, path, item_keys): path for path in paths}
+                try:
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                        if progress is not None:
+                            progress(len(results), len(paths))
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        # Порядок позиций и поставщиков не зависит от порядка завершения файлов.
+        # Для позиции запоминаются наименование, ед. изм. и количество —
+        # первые непустые из встреченных
+        items = {}
+        if item_names is not None:
+            for name in item_names:
+                items.setdefault(normalize_item_name(name), [name, "", None, [], []])
+        for path in paths:
+            for key, item_name, unit, quantity, supplier, price in results.pop(path):
+                item = items.setdefault(key, [item_name, unit, quantity, [], []])
+                item[1] = item[1] or unit
+                item[2] = item[2] if item[2] is not None else quantity
+                item[3].append(supplier)
+                item[4].append(price)
+
+    # Позиции из item_names без предложений в результат не попадают
+    found = [item for item in items.values() if item[4]]
+    return quotes_from_lists([item[0] for item in found], [item[2] or 1.0 for item in found],
+                             [item[1] or DEFAULT_UNIT for item in found], [item[3] for item in found],
+                             [item[4] for item in found])
@@ -0,0 +1,168 @@
+# =====================================================
+# Калькулятор НМЦД — замеры этапов расчета и экспорта
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+#
+# Включается переменными окружения (или ключами --profile/--cprofile
+# командной строки):
+#   NMCD_PROFILE=timings.jsonl   — JSON-запись на каждый этап ("-" — stderr)
+#   NMCD_CPROFILE=profiles/      — дамп cProfile на каждый внешний этап
+#
+# Пример записи:
+#   {"phase": "export.build", "parent": "export", "ms": 41.7, "rows": 13,
+#    "cells": 170, "styled_cells": 157, "styles": 5, "pid": 4242, ...}
+#
+# Когда замеры выключены, phase() возвращает общий пустой объект,
+# а profiled() сразу вызывает исходную функцию.
+
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+PROFILE_ENV = "NMCD_PROFILE"
+CPROFILE_ENV = "NMCD_CPROFILE"
+
+enabled = False
+_output = None
+_cprofile_dir = None
+
+_lock = threading.Lock()
+_local = threading.local()
+_dump_numbers = itertools.count(1)
+
+
+def configure(output=None, cprofile_dir=None):
+    """Включение (или выключение, если оба аргумента None) замеров.
+
+    Настройки копируются в переменные окружения, чтобы их унаследовали
+    процессы-исполнители пакетного расчета.
+    """
+    global enabled, _output, _cprofile_dir
+    _output = output or None
+    _cprofile_dir = cprofile_dir or None
+    enabled = bool(_output or _cprofile_dir)
+    for name, value in ((PROFILE_ENV, _output), (CPROFILE_ENV, _cprofile_dir)):
+        if value:
+            os.environ[name] = value
+        else:
+            os.environ.pop(name, None)
+    if _cprofile_dir:
+        os.makedirs(_cprofile_dir, exist_ok=True)
+
+
+def configure_from_env():
+    configure(os.environ.get(PROFILE_ENV), os.environ.get(CPROFILE_ENV))
+
+
+def _write(record):
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _lock:
+        if _output == "-":
+            sys.stderr.write(line)
+        else:
+            with open(_output, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **fields):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Phase:
+    """Замер одного этапа; счетчики добавляются через add(cells=..., ...)."""
+
+    __slots__ = ("name", "fields", "parent", "profiler", "_start")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.parent = None
+        self.profiler = None
+        self._start = 0.0
+
+    def add(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack:
+            self.parent = stack[-1].name
+        elif _cprofile_dir:
+            # cProfile снимается только для внешнего этапа потока
+            import cProfile
+            self.profiler = cProfile.Profile()
+        stack.append(self)
+        if self.profiler is not None:
+            self.profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        if self.profiler is not None:
+            self.profiler.disable()
+            file_name = f"{self.name}_{os.getpid()}_{next(_dump_numbers)}.prof"
+            self.profiler.dump_stats(os.path.join(_cprofile_dir, file_name))
+        _local.stack.pop()
+        if _output:
+            record = {"phase": self.name, "parent": self.parent, "ms": round(elapsed * 1000, 3)}
+            record.update(self.fields)
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            record.update(pid=os.getpid(), thread=threading.current_thread().name, time=time.time())
+            _write(record)
+        return False
+
+
+def phase(name, **fields):
+    """Контекстный менеджер замера этапа name с дополнительными полями записи."""
+    if not enabled:
+        return _NULL_PHASE
+    return Phase(name, fields)
+
+
+def profiled(name):
+    """Декоратор: весь вызов функции замеряется как этап name."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with Phase(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _reset_after_fork():
+    # Процесс-исполнитель, порожденный через fork, начинает без этапов родителя
+    global _local
+    _local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+configure_from_env()
@@ -0,0 +1,316 @@
+# =====================================================
+# Калькулятор НМЦД — проект из нескольких позиций
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import numpy as np
+
+import nmcd_core
+import nmcd_profile
+import nmcd_results
+
+# Начальная емкость массивов позиций; при нехватке емкость удваивается
+INITIAL_CAPACITY = 64
+
+# Массивы позиций: тип и значение для незанятых строк
+_COLUMNS = {
+    "quantities": (np.float64, 1.0),
+    "prices": (np.float64, np.nan),
+    "included": (bool, False),
+    "count": (np.int64, 0),
+    "avg_price": (np.float64, np.nan),
+    "std_dev": (np.float64, 0.0),
+    "coeff_variation": (np.float64, 0.0),
+    "exceeds_limit": (bool, False),
+    "nmcd_ryn": (np.float64, np.nan),
+}
+_MATRIX_COLUMNS = ("prices", "included")
+RESULT_COLUMNS = ("count", "avg_price", "std_dev", "coeff_variation", "exceeds_limit", "nmcd_ryn")
+
+
+def _column(name):
+    return property(lambda self: self._buffers[name][:self._size])
+
+
+class Project:
+    """Позиции договора с пересчетом только измененных.
+
+    Цены хранятся матрицей «позиции × поставщики» (NaN — нет
+    предложения), результаты — массивами по позициям в формате
+    nmcd_core.calculate_batch. Изменение цены или количества помечает
+    позицию, recalculate() пересчитывает помеченные позиции одним
+    вызовом calculate_batch и поправляет итог на разницу их НМЦД, поэтому
+    правка не зависит от числа позиций в проекте.
+
+    Свойства quantities, prices, count и т. д. — представления массивов
+    без копирования; менять их следует через методы set_*.
+
+    Для сохранения в файл (nmcd_project_file) проект запоминает, какие
+    цены и количества менялись и какие позиции добавлены после
+    последнего сохранения: такие изменения дописываются в конец файла.
+    """
+
+    quantities = _column("quantities")
+    prices = _column("prices")
+    included = _column("included")
+    count = _column("count")
+    avg_price = _column("avg_price")
+    std_dev = _column("std_dev")
+    coeff_variation = _column("coeff_variation")
+    exceeds_limit = _column("exceeds_limit")
+    nmcd_ryn = _column("nmcd_ryn")
+
+    def __init__(self, columns=0, exclude_outliers=False):
+        self.item_names = []
+        self.units = []
+        self.supplier_names = []
+        self.exclude_outliers = exclude_outliers
+        self.total = 0.0
+        self._size = 0
+        self._buffers = {}
+        self._dirty = set()
+        self._all_dirty = False
+        self._allocate(INITIAL_CAPACITY, columns)
+        self.mark_saved(None)
+
+    @classmethod
+    def from_quotes(cls, quotes, exclude_outliers=False):
+        """Проект из позиций в формате nmcd_cli.read_quotes (все позиции помечены)."""
+        prices = np.asarray(quotes["prices"], dtype=np.float64)
+        project = cls(prices.shape[1], exclude_outliers)
+        project._reserve(len(prices), prices.shape[1])
+        project._size = len(prices)
+        project.prices[:] = prices
+        project.quantities[:] = quotes["quantities"]
+        project.item_names = list(quotes["item_names"])
+        project.units = list(quotes["units"])
+        project.supplier_names = [list(names) for names in quotes["supplier_names"]]
+        project._all_dirty = True
+        return project
+
+    @classmethod
+    def from_arrays(cls, arrays, item_names, units, supplier_names, exclude_outliers=False, total=0.0):
+        """Проект поверх готовых массивов без копирования (например,
+        отображенных в память из файла проекта).
+
+        arrays — словарь с массивами quantities, prices, included и
+        результатов calculate_batch; результаты считаются актуальными,
+        total — сумма их НМЦД.
+        """
+        project = cls(0, exclude_outliers)
+        project._buffers = {name: arrays[name] for name in _COLUMNS}
+        project._size = len(arrays["quantities"])
+        project.item_names = item_names
+        project.units = units
+        project.supplier_names = supplier_names
+        project.total = total
+        return project
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def columns(self):
+        return self._buffers["prices"].shape[1]
+
+    @property
+    def dirty(self):
+        return self._all_dirty or bool(self._dirty)
+
+    # --- Хранение ---
+
+    def _allocate(self, capacity, columns):
+        buffers = {}
+        for name, (dtype, fill) in _COLUMNS.items():
+            shape = (capacity, columns) if name in _MATRIX_COLUMNS else (capacity,)
+            buffer = buffers[name] = np.full(shape, fill, dtype=dtype)
+            old = self._buffers.get(name)
+            if old is not None:
+                if buffer.ndim == 2:
+                    buffer[:self._size, :old.shape[1]] = old[:self._size]
+                else:
+                    buffer[:self._size] = old[:self._size]
+        self._buffers = buffers
+
+    def _reserve(self, size, columns):
+        capacity = len(self._buffers["quantities"])
+        if size > capacity or columns > self.columns:
+            if size > capacity:
+                capacity = max(size, capacity * 2, INITIAL_CAPACITY)
+            self._allocate(capacity, max(columns, self.columns))
+
+    def detach(self):
+        """Перенос массивов в собственную память процесса — после этого
+        файл, из которого они были отображены, можно перезаписать."""
+        self._allocate(len(self._buffers["quantities"]), self.columns)
+
+    def _check_row(self, row):
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+
+    # --- Изменение позиций ---
+
+    def add_position(self, item_name, quantity, unit, supplier_names=(), prices=()):
+        """Добавление позиции в конец проекта; возвращает ее номер (с 0)."""
+        prices = list(prices)
+        supplier_names = list(supplier_names)
+        row = self._size
+        # Столбец матрицы есть у каждого поставщика позиции, даже без цены
+        self._reserve(row + 1, max(len(prices), len(supplier_names)))
+        self._size += 1
+        self.item_names.append(item_name)
+        self.units.append(unit)
+        self.supplier_names.append(supplier_names)
+        self.quantities[row] = quantity
+        self.prices[row, :len(prices)] = prices
+        self._dirty.add(row)
+        return row
+
+    def remove_positions(self, rows):
+        """Удаление позиций; итог уменьшается на их НМЦД без пересчета остальных."""
+        removed = np.unique(np.asarray(list(rows), dtype=np.intp))
+        if not removed.size:
+            return
+        if removed[0] < 0:
+            raise IndexError(int(removed[0]))
+        if removed[-1] >= self._size:
+            raise IndexError(int(removed[-1]))
+        self.total -= float(np.nansum(self.nmcd_ryn[removed]))
+
+        size = self._size
+        keep = np.ones(size, dtype=bool)
+        keep[removed] = False
+        remaining = size - removed.size
+        for name, (_, fill) in _COLUMNS.items():
+            buffer = self._buffers[name]
+            buffer[:remaining] = buffer[:size][keep]
+            buffer[remaining:size] = fill
+        self._size = remaining
+        for names in (self.item_names, self.units, self.supplier_names):
+            names[:] = [value for value, kept in zip(names, keep) if kept]
+        # Номера помеченных позиций сдвигаются на число удаленных перед ними
+        self._dirty = {row - int(np.searchsorted(removed, row)) for row in self._dirty if keep[row]}
+        if not remaining:
+            self.total = 0.0
+        self._restructured = True
+
+    def set_item_name(self, row, item_name):
+        self._check_row(row)
+        self.item_names[row] = item_name
+        self._restructured = True
+
+    def set_unit(self, row, unit):
+        self._check_row(row)
+        self.units[row] = unit
+        self._restructured = True
+
+    def set_quantity(self, row, quantity):
+        self._check_row(row)
+        self.quantities[row] = quantity
+        self._dirty.add(row)
+        if row < self._saved_size:
+            self._changed_quantities.add(row)
+
+    def set_price(self, row, column, price, supplier_name=None):
+        """Цена поставщика column (с 0); None удаляет предложение.
+
+        supplier_name — новое название поставщика этого столбца позиции.
+        """
+        self._check_row(row)
+        if column >= self.columns:
+            self._reserve(self._size, column + 1)
+        names = self.supplier_names[row]
+        if len(names) <= column or supplier_name is not None:
+            # Список заменяется, а не меняется: его могут разделять копии quotes()
+            names = names + [f"Поставщик {number + 1}" for number in range(len(names), column + 1)]
+            if supplier_name is not None:
+                names[column] = supplier_name
+            self.supplier_names[row] = names
+        self.prices[row, column] = np.nan if price is None else price
+        self._dirty.add(row)
+        if row < self._saved_size:
+            self._changed_prices.add((row, column))
+
+    def set_exclude_outliers(self, exclude_outliers):
+        if exclude_outliers != self.exclude_outliers:
+            self.exclude_outliers = exclude_outliers
+            self._all_dirty = True
+
+    # --- Изменения после сохранения ---
+
+    def mark_saved(self, file_path, file_size=0):
+        """Отметка о сохранении проекта в file_path (размер файла file_size)."""
+        self.file_path = file_path
+        self.file_size = file_size
+        self._saved_size = self._size
+        self._changed_prices = set()
+        self._changed_quantities = set()
+        self._restructured = False
+
+    def changes(self):
+        """Изменения после mark_saved(): (номер первой добавленной позиции,
+        [(позиция, поставщик), ...] измененных цен, [позиция, ...]
+        измененных количеств).
+
+        None — позиции удалялись или переименовывались; такие изменения
+        сохраняются только перезаписью всего файла.
+        """
+        if self._restructured:
+            return None
+        return self._saved_size, sorted(self._changed_prices), sorted(self._changed_quantities)
+
+    # --- Расчет ---
+
+    def recalculate(self):
+        """Пересчет помеченных позиций; возвращает их номера по возрастанию."""
+        if not self.dirty:
+            return np.empty(0, dtype=np.intp)
+        full = self._all_dirty or len(self._dirty) == self._size
+        if full:
+            rows = np.arange(self._size)
+        else:
+            rows = np.fromiter(sorted(self._dirty), dtype=np.intp, count=len(self._dirty))
+        self._dirty.clear()
+        self._all_dirty = False
+
+        with nmcd_profile.phase("project.recalculate", rows=len(rows), positions=self._size):
+            prices = self.prices[rows]
+            valid = ~np.isnan(prices)
+            if self.exclude_outliers:
+                valid = nmcd_core.exclude_outliers(prices, valid)
+            result = nmcd_core.calculate_batch(prices, self.quantities[rows], valid)
+
+            previous = 0.0 if full else float(np.nansum(self.nmcd_ryn[rows]))
+            self.included[rows] = valid
+            for name in RESULT_COLUMNS:
+                self._buffers[name][rows] = result[name]
+            # Полный пересчет заодно убирает накопленную погрешность итога
+            if full:
+                self.total = float(np.nansum(result["nmcd_ryn"]))
+            else:
+                self.total += float(np.nansum(result["nmcd_ryn"])) - previous
+        return rows
+
+    def quotes(self):
+        """Копия позиций в формате nmcd_cli.read_quotes."""
+        return {
+            "item_names": list(self.item_names),
+            "quantities": self.quantities.copy(),
+            "units": list(self.units),
+            "supplier_names": list(self.supplier_names),
+            "prices": self.prices.copy(),
+        }
+
+    def result(self):
+        """Копия результатов в формате nmcd_cli.calculate (с маской included)."""
+        result = {name: self._buffers[name][:self._size].copy() for name in RESULT_COLUMNS}
+        result["included"] = self.included.copy()
+        return result
+
+    def to_table(self, nmcd_date=None):
+        """Независимая от дальнейших правок nmcd_results.ResultTable — для экспорта в фоне."""
+        return nmcd_results.ResultTable(self.quotes(), self.result(), nmcd_date)
@@ -0,0 +1,321 @@
+# =====================================================
+# Калькулятор НМЦД — файл проекта (двоичный формат)
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+#
+# Устройство файла (все числа — little-endian):
+#   заголовок, 64 байта: сигнатура, версия, флаги, число позиций,
+#     число столбцов цен, размер таблицы строк, начало журнала, итог НМЦД;
+#   массивы по позициям (каждый с границы 8 байт): количества, матрица
+#     цен (NaN — нет предложения), маска учтенных предложений, результаты
+#     расчета, номера строк наименований, ед. измерения и поставщиков
+#     (-1 — нет поставщика);
+#   таблица строк — UTF-8, строки разделены нулевым байтом;
+#   журнал — записи, дописанные после полного сохранения: новая позиция,
+#     цена поставщика, количество.
+#
+# Массивы при открытии отображаются в память без чтения и копирования
+# (с копированием при записи), журнал применяется поверх них.
+
+import itertools
+import mmap
+import os
+import struct
+
+import numpy as np
+
+import nmcd_profile
+import nmcd_project
+from nmcd_history import normalize_item_name
+
+FILE_EXTENSION = ".nmcdp"
+MAGIC = b"NMCDPRJ\x00"
+VERSION = 1
+
+HEADER = struct.Struct("<8sIIqqqqd")
+HEADER_SIZE = 64
+ALIGNMENT = 8
+
+FLAG_EXCLUDE_OUTLIERS = 1
+
+# Записи журнала: тип (1 байт) и длина данных (4 байта), затем данные
+RECORD_HEADER = struct.Struct("<BI")
+RECORD_POSITION = 1   # количество, наименование, ед. измерения
+RECORD_QUOTE = 2      # позиция, столбец, цена (NaN — удаление), поставщик
+RECORD_QUANTITY = 3   # позиция, количество
+_POSITION = struct.Struct("<d")
+_QUOTE = struct.Struct("<qid")
+_QUANTITY = struct.Struct("<qd")
+_TEXT_SIZE = struct.Struct("<I")
+
+
+def _sections(positions, columns):
+    # Порядок и типы массивов файла; размеры зависят только от заголовка
+    return (
+        ("quantities", np.float64, (positions,)),
+        ("prices", np.float64, (positions, columns)),
+        ("included", np.bool_, (positions, columns)),
+        ("count", np.int64, (positions,)),
+        ("avg_price", np.float64, (positions,)),
+        ("std_dev", np.float64, (positions,)),
+        ("coeff_variation", np.float64, (positions,)),
+        ("exceeds_limit", np.bool_, (positions,)),
+        ("nmcd_ryn", np.float64, (positions,)),
+        ("item_ids", np.int32, (positions,)),
+        ("unit_ids", np.int32, (positions,)),
+        ("supplier_ids", np.int32, (positions, columns)),
+    )
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _layout(positions, columns):
+    """Смещения массивов и начало таблицы строк."""
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, dtype, shape in _sections(positions, columns):
+        offsets[name] = offset
+        offset = _aligned(offset + np.dtype(dtype).itemsize * int(np.prod(shape)))
+    return offsets, offset
+
+
+def _read_header(data, path):
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"Файл {path} не является файлом проекта НМЦД.")
+    magic, version, flags, positions, columns, strings_size, journal_start, total = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Файл {path} не является файлом проекта НМЦД.")
+    if version != VERSION:
+        raise ValueError(f"Версия файла проекта {version} не поддерживается.")
+    return flags, positions, columns, strings_size, journal_start, total
+
+
+def _text(value):
+    data = value.encode("utf-8")
+    return _TEXT_SIZE.pack(len(data)) + data
+
+
+def _read_text(data, offset):
+    size, = _TEXT_SIZE.unpack_from(data, offset)
+    offset += _TEXT_SIZE.size
+    return bytes(data[offset:offset + size]).decode("utf-8"), offset + size
+
+
+def _record(kind, payload):
+    return RECORD_HEADER.pack(kind, len(payload)) + payload
+
+
+# --- Полное сохранение ---
+
+def _write_snapshot(path, project):
+    strings, index = [], {}
+
+    def string_ids(values):
+        for value in dict.fromkeys(values):
+            if value not in index:
+                index[value] = len(strings)
+                # Нулевой байт разделяет строки таблицы
+                strings.append(value.replace("\0", ""))
+        return np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values))
+
+    positions, columns = len(project), project.columns
+    arrays = {name: getattr(project, name) for name in ("quantities", "prices", "included", *nmcd_project.RESULT_COLUMNS)}
+    arrays["item_ids"] = string_ids(project.item_names)
+    arrays["unit_ids"] = string_ids(project.units)
+    # Названия поставщиков всех позиций подряд; маска «столбец < числа
+    # названий позиции» раскладывает их по строкам матрицы в том же порядке
+    lengths = np.fromiter(map(len, project.supplier_names), dtype=np.intp, count=positions)
+    supplier_ids = arrays["supplier_ids"] = np.full((positions, columns), -1, dtype=np.int32)
+    supplier_ids[np.arange(columns) < lengths[:, np.newaxis]] = string_ids(
+        list(itertools.chain.from_iterable(project.supplier_names)))
+    blob = "\0".join(strings).encode("utf-8")
+
+    offsets, strings_start = _layout(positions, columns)
+    journal_start = _aligned(strings_start + len(blob))
+    flags = FLAG_EXCLUDE_OUTLIERS if project.exclude_outliers else 0
+    total = float(np.nansum(project.nmcd_ryn))
+
+    # Новый файл пишется рядом и заменяет старый целиком: при сбое
+    # записи остается прежняя версия проекта
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, flags, positions, columns, len(blob), journal_start, total)
+                    .ljust(HEADER_SIZE, b"\0"))
+            for name, dtype, _ in _sections(positions, columns):
+                f.write(b"\0" * (offsets[name] - f.tell()))
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+            f.write(b"\0" * (strings_start - f.tell()))
+            f.write(blob)
+            f.write(b"\0" * (journal_start - f.tell()))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return journal_start
+
+
+def _journal_records(project, changes):
+    first_new, prices, quantities = changes
+    records = []
+    for row, column in prices:
+        records.append(_record(RECORD_QUOTE, _QUOTE.pack(row, column, project.prices[row, column])
+                               + _text(project.supplier_names[row][column])))
+    for row in quantities:
+        records.append(_record(RECORD_QUANTITY, _QUANTITY.pack(row, project.quantities[row])))
+    for row in range(first_new, len(project)):
+        records.append(_record(RECORD_POSITION, _POSITION.pack(project.quantities[row])
+                               + _text(project.item_names[row]) + _text(project.units[row])))
+        for column in np.flatnonzero(~np.isnan(project.prices[row])):
+            records.append(_record(RECORD_QUOTE, _QUOTE.pack(row, column, project.prices[row, column])
+                                   + _text(project.supplier_names[row][column])))
+    return records
+
+
+def save_project(path, project):
+    """Сохранение проекта (nmcd_project.Project) в файл path.
+
+    Если проект открыт из этого файла или уже сохранялся в него, файл с
+    тех пор не менялся, а в проекте только добавлялись позиции и менялись
+    цены и количества, изменения дописываются в журнал в конце файла.
+    Иначе (и когда журнал становится больше основной части или за
+    последней целой записью журнала остались байты недописанной) файл
+    записывается заново. Перед полной записью помеченные позиции
+    пересчитываются, чтобы в файл попали актуальные результаты.
+    """
+    path = os.path.abspath(path)
+    changes = project.changes()
+    if (changes is not None and project.file_path == path and os.path.exists(path)
+            and os.path.getsize(path) == project.file_size):
+        with open(path, "rb") as f:
+            journal_start = _read_header(f.read(HEADER_SIZE), path)[4]
+        if project.file_size - journal_start <= journal_start:
+            with nmcd_profile.phase("project.append", rows=len(project) - changes[0], quotes=len(changes[1])):
+                with open(path, "ab") as f:
+                    f.write(b"".join(_journal_records(project, changes)))
+            project.mark_saved(path, os.path.getsize(path))
+            return
+
+    with nmcd_profile.phase("project.save", positions=len(project)):
+        project.recalculate()
+        if project.file_path == path:
+            # Массивы могут быть отображены из перезаписываемого файла
+            project.detach()
+        _write_snapshot(path, project)
+    project.mark_saved(path, os.path.getsize(path))
+
+
+# --- Открытие ---
+
+def _apply_journal(project, data, offset, path):
+    """Применение записей журнала; возвращает конец последней целой записи.
+
+    Неполная последняя запись (сбой во время дописывания) пропускается.
+    """
+    while offset + RECORD_HEADER.size <= len(data):
+        kind, size = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        if start + size > len(data):
+            break
+        if kind == RECORD_POSITION:
+            quantity, = _POSITION.unpack_from(data, start)
+            item_name, text_offset = _read_text(data, start + _POSITION.size)
+            unit, _ = _read_text(data, text_offset)
+            project.add_position(item_name, quantity, unit)
+        elif kind == RECORD_QUOTE:
+            row, column, price = _QUOTE.unpack_from(data, start)
+            supplier_name, _ = _read_text(data, start + _QUOTE.size)
+            project.set_price(row, column, None if np.isnan(price) else price, supplier_name)
+        elif kind == RECORD_QUANTITY:
+            row, quantity = _QUANTITY.unpack_from(data, start)
+            project.set_quantity(row, quantity)
+        else:
+            raise ValueError(f"Файл проекта {path} поврежден: неизвестная запись журнала.")
+        offset = start + size
+    return offset
+
+
+def load_project(path):
+    """Открытие файла проекта; возвращает nmcd_project.Project.
+
+    Массивы отображаются из файла в память, в оперативную память
+    читаются только таблица строк и журнал. Позиции, измененные
+    журналом, помечены для пересчета (Project.recalculate()).
+    """
+    path = os.path.abspath(path)
+    with nmcd_profile.phase("project.open") as open_phase:
+        with open(path, "rb") as f:
+            # Копирование при записи: правки проекта не попадают в файл
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        flags, positions, columns, strings_size, journal_start, total = _read_header(data, path)
+        offsets, strings_start = _layout(positions, columns)
+        if journal_start < strings_start + strings_size or journal_start > len(data):
+            raise ValueError(f"Файл проекта {path} поврежден.")
+
+        arrays = {}
+        for name, dtype, shape in _sections(positions, columns):
+            arrays[name] = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)),
+                                         offset=offsets[name]).reshape(shape)
+        strings = data[strings_start:strings_start + strings_size].decode("utf-8").split("\0") \
+            if strings_size else [""]
+        table = np.array(strings + [None], dtype=object)   # номер -1 — None
+
+        supplier_ids = arrays["supplier_ids"]
+        supplier_names = table[supplier_ids].tolist()
+        # Номера -1 в конце строки — столбцы, в которых у позиции нет поставщика
+        present = supplier_ids >= 0
+        lengths = np.where(present.any(axis=1), columns - np.argmax(present[:, ::-1], axis=1), 0)
+        for row in np.flatnonzero(lengths < columns).tolist():
+            del supplier_names[row][lengths[row]:]
+        project = nmcd_project.Project.from_arrays(
+            arrays, table[arrays["item_ids"]].tolist(), table[arrays["unit_ids"]].tolist(), supplier_names,
+            exclude_outliers=bool(flags & FLAG_EXCLUDE_OUTLIERS), total=total)
+
+        # Размер файла запоминается по концу целых записей: если за ним
+        # есть остаток недописанной записи, размеры не совпадут и следующее
+        # сохранение перезапишет файл, а не допишет записи после остатка
+        journal_end = _apply_journal(project, data, journal_start, path)
+        project.mark_saved(path, journal_end)
+        open_phase.add(positions=len(project), journal_bytes=len(data) - journal_start)
+    return project
+
+
+# --- Дописывание предложений ---
+
+def append_quotes(path, quotes):
+    """Дописывание предложений (в формате nmcd_cli.read_quotes, например
+    из nmcd_import.import_offers) в файл проекта без его перезаписи.
+
+    Позиции сопоставляются по наименованию без учета регистра и лишних
+    пробелов, поставщики — по названию: цена известного поставщика
+    заменяется, новый поставщик добавляется. Позиции, которых нет в
+    проекте, добавляются в конец. Возвращает число записанных цен.
+    """
+    project = load_project(path)
+    rows = {}
+    for row, item_name in enumerate(project.item_names):
+        rows.setdefault(normalize_item_name(item_name), row)
+
+    written = 0
+    for position, item_name in enumerate(quotes["item_names"]):
+        key = normalize_item_name(item_name)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = project.add_position(
+                item_name, float(quotes["quantities"][position]), quotes["units"][position])
+        for supplier_name, price in zip(quotes["supplier_names"][position], quotes["prices"][position]):
+            if np.isnan(price):
+                continue
+            names = project.supplier_names[row]
+            column = names.index(supplier_name) if supplier_name in names else len(names)
+            project.set_price(row, column, float(price), supplier_name)
+            written += 1
+    save_project(path, project)
+    return written
@@ -0,0 +1,247 @@
+# =====================================================
+# Калькулятор НМЦД — таблица позиций проекта
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import math
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QLocale, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QDoubleValidator
+from PyQt6.QtWidgets import QStyledItemDelegate, QLineEdit
+
+import nmcd_core
+import nmcd_project
+
+COLUMN_ITEM_NAME = 0
+COLUMN_QUANTITY = 1
+COLUMN_UNIT = 2
+FIRST_PRICE_COLUMN = 3
+LEADING_TITLES = ("Наименование", "Количество", "Ед. измерения")
+RESULT_TITLES = ("Цср", "V, %", "НМЦД")
+
+# Цвет позиций с V выше нормы — как у строки текущего результата
+EXCEEDS_LIMIT_COLOR = QColor("#b00020")
+EXCLUDED_PRICE_COLOR = QColor("#9e9e9e")
+
+# При пересчете большего числа позиций представление получает одно
+# уведомление на весь диапазон, а не по строке
+ROW_SIGNALS_LIMIT = 200
+
+
+def _format_number(value):
+    return f"{value:.2f}".replace('.', ',')
+
+
+class ProjectTableModel(QAbstractTableModel):
+    """Позиции проекта: наименование, количество, ед. измерения, цены
+    поставщиков и результаты расчета.
+
+    Данные хранятся в nmcd_project.Project. Правки цен и количества
+    только помечают позиции; пересчет выполняется после обработки
+    текущих событий (таймер с нулевой задержкой), поэтому серия правок
+    дает один пересчет. Затем обновляются ячейки только пересчитанных
+    позиций и испускается total_changed(итог).
+
+    Последний столбец цен всегда пустой — в него вводится цена нового
+    поставщика.
+    """
+
+    total_changed = pyqtSignal(float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.project = nmcd_project.Project()
+        self._recalc_timer = QTimer(self)
+        self._recalc_timer.setSingleShot(True)
+        self._recalc_timer.setInterval(0)
+        self._recalc_timer.timeout.connect(self.recalculate)
+
+    def _result_column(self):
+        # Столбцы цен проекта и один пустой для нового поставщика
+        return FIRST_PRICE_COLUMN + self.project.columns + 1
+
+    # --- Интерфейс QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.project)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._result_column() + len(RESULT_TITLES)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Vertical:
+            return str(section + 1)
+        if section < FIRST_PRICE_COLUMN:
+            return LEADING_TITLES[section]
+        if section < self._result_column():
+            return f"Цена {section - FIRST_PRICE_COLUMN + 1}"
+        return RESULT_TITLES[section - self._result_column()]
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() < self._result_column():
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        project = self.project
+        row = index.row()
+        column = index.column()
+        result_column = self._result_column()
+
+        if role == Qt.ItemDataRole.ForegroundRole:
+            if column >= result_column and project.exceeds_limit[row]:
+                return EXCEEDS_LIMIT_COLOR
+            if FIRST_PRICE_COLUMN <= column < result_column and self._is_excluded(row, column - FIRST_PRICE_COLUMN):
+                return EXCLUDED_PRICE_COLOR
+            return None
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if FIRST_PRICE_COLUMN <= column < result_column:
+                price_column = column - FIRST_PRICE_COLUMN
+                names = project.supplier_names[row]
+                if price_column < len(names):
+                    excluded = " (исключено из расчета)" if self._is_excluded(row, price_column) else ""
+                    return names[price_column] + excluded
+            return None
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+
+        if column == COLUMN_ITEM_NAME:
+            return project.item_names[row]
+        if column == COLUMN_QUANTITY:
+            return f"{project.quantities[row]:.3f}".rstrip('0').rstrip('.').replace('.', ',')
+        if column == COLUMN_UNIT:
+            return project.units[row]
+        if column < result_column:
+            price_column = column - FIRST_PRICE_COLUMN
+            if price_column >= project.columns or math.isnan(project.prices[row, price_column]):
+                return ""
+            return _format_number(project.prices[row, price_column])
+        if project.count[row] == 0 or role == Qt.ItemDataRole.EditRole:
+            return ""
+        result = column - result_column
+        if result == 0:
+            return _format_number(project.avg_price[row])
+        if result == 1:
+            return f"{_format_number(project.coeff_variation[row])}%"
+        return _format_number(project.nmcd_ryn[row])
+
+    def _is_excluded(self, row, price_column):
+        project = self.project
+        return (price_column < project.columns and not project.included[row, price_column]
+                and not math.isnan(project.prices[row, price_column]) and not project.dirty)
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        project = self.project
+        row = index.row()
+        column = index.column()
+        text = str(value).strip()
+        try:
+            if column == COLUMN_ITEM_NAME:
+                if not text:
+                    return False
+                project.set_item_name(row, text)
+            elif column == COLUMN_UNIT:
+                project.set_unit(row, text)
+            elif column == COLUMN_QUANTITY:
+                if not text:
+                    return False
+                project.set_quantity(row, nmcd_core.parse_float_with_comma(text))
+            elif column < self._result_column():
+                price = nmcd_core.parse_float_with_comma(text) if text else None
+                price_column = column - FIRST_PRICE_COLUMN
+                if price_column < project.columns:
+                    project.set_price(row, price_column, price)
+                elif price is not None:
+                    # Цена в пустом столбце добавляет поставщика, правее появляется новый пустой
+                    self.beginInsertColumns(QModelIndex(), column + 1, column + 1)
+                    project.set_price(row, price_column, price)
+                    self.endInsertColumns()
+                else:
+                    return False
+            else:
+                return False
+        except ValueError:
+            return False
+
+        self.dataChanged.emit(index, index)
+        if column not in (COLUMN_ITEM_NAME, COLUMN_UNIT):
+            self._recalc_timer.start()
+        return True
+
+    def removeRows(self, position, count, parent=QModelIndex()):
+        if parent.isValid() or count <= 0 or position < 0 or position + count > len(self.project):
+            return False
+        self.beginRemoveRows(parent, position, position + count - 1)
+        self.project.remove_positions(range(position, position + count))
+        self.endRemoveRows()
+        self.total_changed.emit(self.project.total)
+        return True
+
+    # --- Работа с проектом ---
+
+    def set_project(self, project):
+        """Замена всех позиций (например, загруженным из файла проектом)."""
+        self.beginResetModel()
+        self.project = project
+        self.endResetModel()
+        self.recalculate()
+
+    def add_position(self, item_name, quantity, unit, supplier_names=(), prices=()):
+        project = self.project
+        row = len(project)
+        if len(prices) > project.columns:
+            # Новые столбцы цен — редкий случай, проще перестроить представление
+            self.beginResetModel()
+            project.add_position(item_name, quantity, unit, supplier_names, prices)
+            self.endResetModel()
+        else:
+            self.beginInsertRows(QModelIndex(), row, row)
+            project.add_position(item_name, quantity, unit, supplier_names, prices)
+            self.endInsertRows()
+        self._recalc_timer.start()
+        return row
+
+    def set_exclude_outliers(self, exclude_outliers):
+        self.project.set_exclude_outliers(bool(exclude_outliers))
+        self._recalc_timer.start()
+
+    def recalculate(self):
+        """Пересчет помеченных позиций и обновление их строк и итога."""
+        self._recalc_timer.stop()
+        rows = self.project.recalculate()
+        if len(rows):
+            # Вместе с результатами меняется и отметка исключенных цен
+            last = self.columnCount() - 1
+            if len(rows) > ROW_SIGNALS_LIMIT:
+                self.dataChanged.emit(self.index(int(rows[0]), FIRST_PRICE_COLUMN), self.index(int(rows[-1]), last))
+            else:
+                for row in rows:
+                    self.dataChanged.emit(self.index(int(row), FIRST_PRICE_COLUMN), self.index(int(row), last))
+        self.total_changed.emit(self.project.total)
+
+
+class ProjectDelegate(QStyledItemDelegate):
+    # Количество и цены — с тем же валидатором, что и остальные числовые поля;
+    # передаются в модель при каждом нажатии, как цены в таблице поставщиков
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        if index.column() == COLUMN_QUANTITY or index.column() >= FIRST_PRICE_COLUMN:
+            validator = QDoubleValidator(editor)
+            validator.setLocale(QLocale(QLocale.Language.Russian, QLocale.Country.Russia))
+            validator.setBottom(0.0)
+            editor.setValidator(validator)
+            editor.textChanged.connect(lambda _: self.commitData.emit(editor))
+        return editor
@@ -0,0 +1,172 @@
+# =====================================================
+# Калькулятор НМЦД — таблица предложений поставщиков
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import itertools
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QLocale, pyqtSignal
+from PyQt6.QtGui import QDoubleValidator
+from PyQt6.QtWidgets import QStyledItemDelegate, QLineEdit
+
+COLUMN_SUPPLIER = 0
+COLUMN_NAME = 1
+COLUMN_PRICE = 2
+COLUMN_TITLES = ("Поставщик", "Название поставщика", "Цена")
+
+
+class QuoteRow:
+    __slots__ = ("row_id", "enabled", "name", "price_text")
+
+    def __init__(self, row_id, enabled=True, name="", price_text=""):
+        self.row_id = row_id
+        self.enabled = enabled
+        self.name = name
+        self.price_text = price_text
+
+    @property
+    def effective_price_text(self):
+        # Цена отключенного поставщика в расчете не участвует
+        return self.price_text if self.enabled else ""
+
+
+class QuoteTableModel(QAbstractTableModel):
+    """Произвольное количество предложений поставщиков.
+
+    Строки хранятся в списке, представление (QTableView) отрисовывает
+    только видимые. При каждом изменении учитываемой цены, включая
+    отключение и удаление строки, испускается price_changed(id строки,
+    текст цены) — по нему ведется живой пересчет.
+    """
+
+    price_changed = pyqtSignal(int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._ids = itertools.count()
+
+    # --- Интерфейс QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMN_TITLES)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return COLUMN_TITLES[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        row = self._rows[index.row()]
+        if index.column() == COLUMN_SUPPLIER:
+            return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable
+        flags = Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
+        if row.enabled:
+            flags |= Qt.ItemFlag.ItemIsEnabled
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if column == COLUMN_SUPPLIER:
+            if role == Qt.ItemDataRole.DisplayRole:
+                return f"Поставщик {index.row() + 1}"
+            if role == Qt.ItemDataRole.CheckStateRole:
+                return Qt.CheckState.Checked if row.enabled else Qt.CheckState.Unchecked
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return row.name if column == COLUMN_NAME else row.price_text
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid():
+            return False
+        row = self._rows[index.row()]
+        column = index.column()
+        old_price_text = row.effective_price_text
+
+        if column == COLUMN_SUPPLIER and role == Qt.ItemDataRole.CheckStateRole:
+            row.enabled = Qt.CheckState(value) == Qt.CheckState.Checked
+            # Доступность названия и цены зависит от флажка
+            self.dataChanged.emit(index, self.index(index.row(), COLUMN_PRICE))
+        elif column == COLUMN_NAME and role == Qt.ItemDataRole.EditRole:
+            row.name = str(value).strip()
+            self.dataChanged.emit(index, index)
+        elif column == COLUMN_PRICE and role == Qt.ItemDataRole.EditRole:
+            row.price_text = str(value).strip()
+            self.dataChanged.emit(index, index)
+        else:
+            return False
+
+        if row.effective_price_text != old_price_text:
+            self.price_changed.emit(row.row_id, row.effective_price_text)
+        return True
+
+    def removeRows(self, position, count, parent=QModelIndex()):
+        if parent.isValid() or count <= 0 or position < 0 or position + count > len(self._rows):
+            return False
+        self.beginRemoveRows(parent, position, position + count - 1)
+        removed = self._rows[position:position + count]
+        del self._rows[position:position + count]
+        self.endRemoveRows()
+        for row in removed:
+            if row.effective_price_text:
+                self.price_changed.emit(row.row_id, "")
+        return True
+
+    # --- Работа с предложениями ---
+
+    def add_quote(self, name="", price_text="", enabled=True):
+        position = len(self._rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        row = QuoteRow(next(self._ids), enabled, name, price_text)
+        self._rows.append(row)
+        self.endInsertRows()
+        if row.effective_price_text:
+            self.price_changed.emit(row.row_id, row.effective_price_text)
+        return position
+
+    def set_quotes(self, quotes):
+        """Замена всех строк списком пар (название, текст цены)."""
+        self.removeRows(0, len(self._rows))
+        for name, price_text in quotes:
+            self.add_quote(name, price_text)
+
+    def has_prices(self):
+        """Введена ли хотя бы одна цена (в том числе у отключенного поставщика)."""
+        return any(row.price_text for row in self._rows)
+
+    def active_quotes(self):
+        """Номера (с 1), названия и тексты цен учитываемых поставщиков."""
+        return [(number, row.name, row.price_text)
+                for number, row in enumerate(self._rows, start=1) if row.enabled]
+
+
+class PriceDelegate(QStyledItemDelegate):
+    # Редактор цены с тем же валидатором, что и у остальных числовых полей
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        if index.column() == COLUMN_PRICE:
+            validator = QDoubleValidator(editor)
+            validator.setLocale(QLocale(QLocale.Language.Russian, QLocale.Country.Russia))
+            validator.setBottom(0.0)
+            editor.setValidator(validator)
+            editor.setPlaceholderText("Цена")
+            # Цена передается в модель при каждом нажатии — для живого пересчета
+            editor.textChanged.connect(lambda _: self.commitData.emit(editor))
+        else:
+            editor.setPlaceholderText("Название поставщика")
+        return editor
@@ -0,0 +1,209 @@
+# =====================================================
+# Калькулятор НМЦД — компактное хранение результатов расчета
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+import nmcd_core
+
+
+@dataclass(frozen=True)
+class ItemResult:
+    """Результат расчета одной позиции.
+
+    prices и supplier_names — учтенные предложения, excluded — пары
+    (поставщик, цена) исключенных выбросов.
+    """
+
+    __slots__ = ("item_name", "quantity", "unit", "prices", "supplier_names", "excluded",
+                 "avg_price", "std_dev", "coeff_variation", "nmcd_ryn", "nmcd_date")
+
+    item_name: str
+    quantity: float
+    unit: str
+    prices: tuple
+    supplier_names: tuple
+    excluded: tuple
+    avg_price: float
+    std_dev: float
+    coeff_variation: float
+    nmcd_ryn: float
+    nmcd_date: object
+
+    @property
+    def count(self):
+        return len(self.prices)
+
+    @property
+    def exceeds_limit(self):
+        return self.coeff_variation > nmcd_core.COEFF_VARIATION_LIMIT
+
+    def __reduce__(self):
+        # Неизменяемый объект со __slots__ восстанавливается через конструктор
+        return ItemResult, tuple(getattr(self, field.name) for field in fields(self))
+
+
+class ResultTable:
+    """Результаты пакетного расчета в столбцах-массивах.
+
+    Числа хранятся массивами numpy по позициям (матрица цен — «позиции ×
+    поставщики»), а наименования поставщиков и единиц измерения — один
+    раз в общей таблице строк, на которую ссылаются индексы int32.
+    Строка таблицы (table[i]) — легкое представление ResultRow без
+    копирования данных с тем же набором полей, что и у ItemResult.
+    """
+
+    __slots__ = ("item_names", "quantities", "unit_ids", "prices", "supplier_ids", "included", "strings",
+                 "count", "avg_price", "std_dev", "coeff_variation", "exceeds_limit", "nmcd_ryn", "nmcd_date")
+
+    def __init__(self, quotes, result, nmcd_date=None):
+        """quotes — в формате nmcd_cli.read_quotes, result — calculate_batch
+        или nmcd_cli.calculate (с маской "included", если выбросы исключались).
+
+        Массивы quotes и result используются без копирования.
+        """
+        strings, index = [], {}
+
+        def string_id(text):
+            string = index.get(text)
+            if string is None:
+                string = index[text] = len(strings)
+                strings.append(text)
+            return string
+
+        self.prices = np.asarray(quotes["prices"], dtype=np.float64)
+        self.supplier_ids = np.full(self.prices.shape, -1, dtype=np.int32)
+        for row, names in enumerate(quotes["supplier_names"]):
+            self.supplier_ids[row, :len(names)] = [string_id(name) for name in names]
+        self.unit_ids = np.fromiter((string_id(unit) for unit in quotes["units"]), dtype=np.int32,
+                                    count=len(quotes["units"]))
+        self.strings = strings
+        self.item_names = quotes["item_names"]
+        self.quantities = np.asarray(quotes["quantities"], dtype=np.float64)
+        self.included = result.get("included")
+        self.count = result["count"]
+        self.avg_price = result["avg_price"]
+        self.std_dev = result["std_dev"]
+        self.coeff_variation = result["coeff_variation"]
+        self.exceeds_limit = result["exceeds_limit"]
+        self.nmcd_ryn = result["nmcd_ryn"]
+        self.nmcd_date = nmcd_date
+
+    def __len__(self):
+        return len(self.item_names)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return ResultRow(self, index % len(self))
+
+    def __iter__(self):
+        return (ResultRow(self, index) for index in range(len(self)))
+
+    def priced(self):
+        """Строки позиций, по которым есть хотя бы одно учтенное предложение."""
+        return (ResultRow(self, int(index)) for index in np.flatnonzero(self.count > 0))
+
+    @property
+    def total(self):
+        return float(np.nansum(self.nmcd_ryn))
+
+    def nbytes(self):
+        """Приблизительный объем данных таблицы без наименований позиций."""
+        arrays = (self.quantities, self.unit_ids, self.prices, self.supplier_ids, self.count, self.avg_price,
+                  self.std_dev, self.coeff_variation, self.exceeds_limit, self.nmcd_ryn)
+        return sum(array.nbytes for array in arrays) + (self.included.nbytes if self.included is not None else 0)
+
+
+class ResultRow:
+    """Представление одной строки ResultTable; значения читаются из столбцов по запросу."""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def _valid(self):
+        table = self.table
+        valid = ~np.isnan(table.prices[self.index])
+        if table.included is not None:
+            valid &= table.included[self.index]
+        return valid
+
+    @property
+    def item_name(self):
+        return self.table.item_names[self.index]
+
+    @property
+    def quantity(self):
+        return float(self.table.quantities[self.index])
+
+    @property
+    def unit(self):
+        return self.table.strings[self.table.unit_ids[self.index]]
+
+    @property
+    def price_row(self):
+        # Срез матрицы цен без копирования, включая NaN и исключенные
+        return self.table.prices[self.index]
+
+    @property
+    def prices(self):
+        return self.table.prices[self.index][self._valid()].tolist()
+
+    @property
+    def supplier_names(self):
+        strings = self.table.strings
+        return [strings[string] for string in self.table.supplier_ids[self.index][self._valid()]]
+
+    @property
+    def excluded(self):
+        table = self.table
+        if table.included is None:
+            return []
+        row = self.index
+        excluded = ~np.isnan(table.prices[row]) & ~table.included[row]
+        return [(table.strings[table.supplier_ids[row, column]], float(table.prices[row, column]))
+                for column in np.flatnonzero(excluded)]
+
+    @property
+    def count(self):
+        return int(self.table.count[self.index])
+
+    @property
+    def avg_price(self):
+        return float(self.table.avg_price[self.index])
+
+    @property
+    def std_dev(self):
+        return float(self.table.std_dev[self.index])
+
+    @property
+    def coeff_variation(self):
+        return float(self.table.coeff_variation[self.index])
+
+    @property
+    def exceeds_limit(self):
+        return bool(self.table.exceeds_limit[self.index])
+
+    @property
+    def nmcd_ryn(self):
+        return float(self.table.nmcd_ryn[self.index])
+
+    @property
+    def nmcd_date(self):
+        return self.table.nmcd_date
+
+    def to_item(self):
+        """Отдельная (не связанная с таблицей) копия строки."""
+        return ItemResult(self.item_name, self.quantity, self.unit, tuple(self.prices), tuple(self.supplier_names),
+                          tuple(self.excluded), self.avg_price, self.std_dev, self.coeff_variation,
+                          self.nmcd_ryn, self.nmcd_date)
@@ -0,0 +1,339 @@
+# =====================================================
+# Калькулятор НМЦД — локальный HTTP/JSON-сервис расчета
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+#
+#   python nmcd_service.py [--host 127.0.0.1] [--port 8765] [-j 4]
+#
+#   GET  /health          — {"status": "ok"}
+#   POST /calculate       — расчет пакета позиций, ответ JSON
+#   POST /justification   — книга обоснования (.xlsx) по пакету позиций
+#
+# Тело запроса POST:
+#   {"items": [{"item_name": "Бумага А4", "quantity": 10, "unit": "пачка",
+#               "prices": [250, "245,50", 260], "supplier_names": ["А", "Б", "В"]}, ...],
+#    "exclude_outliers": false,
+#    "date": "01.02.2024", "subject": "Канцелярские товары"}   # только для /justification
+#
+# Сервер работает на asyncio в одном потоке. Крупные пакеты и
+# формирование книг выполняются в пуле процессов, поэтому цикл событий
+# продолжает принимать запросы.
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import nmcd_cli
+import nmcd_core
+import nmcd_excel
+import nmcd_profile
+import nmcd_results
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Ограничения на запрос
+MAX_BODY_SIZE = 64 * 1024 * 1024
+MAX_HEADER_LINES = 100
+
+# Расчет по запросам до такого размера выполняется прямо в цикле событий —
+# передача в другой процесс обошлась бы дороже. Запросы крупнее, включая
+# разбор JSON, обрабатываются в пуле процессов, как и запросы с
+# исключением выбросов: подбор согласованных цен на порядки дороже
+# обычного расчета даже для небольшого тела
+INLINE_BODY_SIZE = 256 * 1024
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """Ошибка запроса, возвращаемая клиенту с кодом status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _float(value, number, field, positive=False):
+    result = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            result = float(value)
+        except OverflowError:
+            pass
+    elif isinstance(value, str):
+        try:
+            result = nmcd_core.parse_float_with_comma(value.strip())
+        except ValueError:
+            pass
+    # "nan", "inf", слишком большие и отрицательные числа в расчет не допускаются,
+    # количество должно быть больше нуля
+    if result is not None and math.isfinite(result) and (result > 0 if positive else result >= 0):
+        return result
+    raise RequestError(400, f"Позиция {number}: некорректное значение {field} {value!r}.")
+
+
+def quotes_from_json(items):
+    """Позиции запроса в формате nmcd_cli.read_quotes."""
+    if not isinstance(items, list) or not items:
+        raise RequestError(400, "Поле items должно быть непустым списком позиций.")
+    item_names, quantities, units, suppliers, prices = [], [], [], [], []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not isinstance(item.get("prices"), list):
+            raise RequestError(400, f"Позиция {number}: ожидается объект со списком prices.")
+        names = item.get("supplier_names")
+        if names is None:
+            names = []
+        elif not isinstance(names, list):
+            raise RequestError(400, f"Позиция {number}: supplier_names должно быть списком.")
+        # Пустые цены пропускаются вместе с названиями их поставщиков
+        offered = [(str(names[i]) if i < len(names) else f"Поставщик {i + 1}", value)
+                   for i, value in enumerate(item["prices"]) if value is not None and value != ""]
+        item_names.append(str(item.get("item_name", "")))
+        quantities.append(_float(item.get("quantity", 1), number, "quantity", positive=True))
+        units.append(str(item.get("unit") or nmcd_cli.DEFAULT_UNIT))
+        suppliers.append([name for name, _ in offered])
+        prices.append([_float(value, number, "prices") for _, value in offered])
+    return nmcd_cli.quotes_from_lists(item_names, quantities, units, suppliers, prices)
+
+
+def _parse_date(text):
+    try:
+        if isinstance(text, str):
+            return nmcd_cli.parse_date(text)
+    except ValueError:
+        pass
+    raise RequestError(400, f"Некорректная дата: {text} (ожидается ДД.ММ.ГГГГ).")
+
+
+def _number(value):
+    # NaN (позиция без цен) в JSON передается как null
+    return None if math.isnan(value) else value
+
+
+def calculate_payload(payload):
+    """Ответ /calculate: результаты по позициям и итог."""
+    with nmcd_profile.phase("service.calculate") as calculate_phase:
+        quotes = quotes_from_json(payload.get("items"))
+        result = nmcd_cli.calculate(quotes, None, workers=1, chunk_size=max(len(quotes["item_names"]), 1),
+                                    exclude_outliers=bool(payload.get("exclude_outliers")))
+        table = nmcd_results.ResultTable(quotes, result)
+        items = [{
+            "item_name": row.item_name,
+            "count": row.count,
+            "avg_price": _number(row.avg_price),
+            "std_dev": row.std_dev,
+            "coeff_variation": row.coeff_variation,
+            "exceeds_limit": row.exceeds_limit,
+            "nmcd_ryn": _number(row.nmcd_ryn),
+            "excluded": [{"supplier": supplier, "price": price} for supplier, price in row.excluded],
+        } for row in table]
+        calculate_phase.add(items=len(items))
+    return {"items": items, "total": table.total}
+
+
+def justification_payload(payload):
+    """Ответ /justification: содержимое книги обоснования."""
+    with nmcd_profile.phase("service.justification"):
+        quotes = quotes_from_json(payload.get("items"))
+        date_text = payload.get("date")
+        nmcd_date = _parse_date(date_text) if date_text not in (None, "") else \
+            datetime.combine(datetime.now().date(), datetime.min.time())
+        result = nmcd_cli.calculate(quotes, nmcd_date, workers=1, chunk_size=max(len(quotes["item_names"]), 1),
+                                    exclude_outliers=bool(payload.get("exclude_outliers")))
+        if not (result["count"] > 0).any():
+            raise RequestError(400, "Нет позиций с ценами.")
+        table = nmcd_results.ResultTable(quotes, result, nmcd_date)
+        # Для одной позиции заголовки как в окне программы, для нескольких — как в общей книге
+        single = len(table) == 1
+        output = io.BytesIO()
+        nmcd_excel.save_justification(
+            output, table.priced(), nmcd_date,
+            subject=payload.get("subject") or (None if single else ""),
+            supplier_names=None if single else (), columns=quotes["prices"].shape[1])
+    return output.getvalue()
+
+
+def _parse_payload(body):
+    try:
+        payload = json.loads(body or b"{}")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise RequestError(400, f"Некорректный JSON: {e}")
+    if not isinstance(payload, dict):
+        raise RequestError(400, "Тело запроса должно быть объектом JSON.")
+    return payload
+
+
+def _run_request(handler, body):
+    # Может выполняться в процессе-исполнителе; ошибки запроса возвращаются
+    # значением, чтобы не зависеть от сериализации исключений
+    try:
+        payload = _parse_payload(body)
+    except RequestError as e:
+        return (e.status, str(e)), None
+    return _run_payload(handler, payload)
+
+
+def _run_payload(handler, payload):
+    try:
+        result = handler(payload)
+        # Ответ кодируется здесь же, чтобы крупный JSON не формировался в цикле событий;
+        # NaN и бесконечность недопустимы в JSON и дают ошибку, а не некорректный ответ
+        if isinstance(result, dict):
+            result = json.dumps(result, ensure_ascii=False, allow_nan=False).encode("utf-8")
+    except RequestError as e:
+        return (e.status, str(e)), None
+    except ValueError as e:
+        return (400, str(e)), None
+    return None, result
+
+
+class CalculationService:
+    """Обработка HTTP-запросов на asyncio без сторонних зависимостей.
+
+    Поддерживаются постоянные соединения HTTP/1.1 и тело запроса с
+    Content-Length; этого достаточно для локальных клиентов (ERP,
+    скрипты, curl).
+    """
+
+    ROUTES = {
+        "/calculate": (calculate_payload, "application/json; charset=utf-8"),
+        "/justification": (justification_payload, XLSX_CONTENT_TYPE),
+    }
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, content_type, content = await self.dispatch(method, path, body)
+                except RequestError as e:
+                    status, content_type, content = e.status, *self._json({"error": str(e)})
+                except Exception as e:
+                    status, content_type, content = 500, *self._json({"error": f"Внутренняя ошибка: {e}"})
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write_response(writer, status, content_type, content, keep_alive)
+                if not keep_alive:
+                    break
+        except RequestError as e:
+            # Запрос не удалось разобрать — соединение закрывается после ответа
+            await self._write_response(writer, e.status, *self._json({"error": str(e)}), keep_alive=False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise RequestError(400, "Некорректная строка запроса.")
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise RequestError(400, "Слишком много заголовков.")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise RequestError(400, "Некорректный Content-Length.")
+        if length > MAX_BODY_SIZE:
+            raise RequestError(413, f"Тело запроса больше {MAX_BODY_SIZE} байт.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def dispatch(self, method, path, body):
+        if path == "/health":
+            if method != "GET":
+                raise RequestError(405, "Ожидается GET.")
+            return (200, *self._json({"status": "ok"}))
+        if path not in self.ROUTES:
+            raise RequestError(404, f"Неизвестный адрес {path}.")
+        if method != "POST":
+            raise RequestError(405, "Ожидается POST.")
+
+        handler, content_type = self.ROUTES[path]
+        payload = None
+        if handler is calculate_payload and len(body) <= INLINE_BODY_SIZE:
+            payload = _parse_payload(body)
+        if payload is not None and not payload.get("exclude_outliers"):
+            error, result = _run_payload(handler, payload)
+        else:
+            loop = asyncio.get_running_loop()
+            error, result = await loop.run_in_executor(self.executor, _run_request, handler, body)
+        if error is not None:
+            raise RequestError(*error)
+        return 200, content_type, result
+
+    @staticmethod
+    def _json(data):
+        return "application/json; charset=utf-8", json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    async def _write_response(writer, status, content_type, content, keep_alive=True):
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(content)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + content)
+        await writer.drain()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, ready=None):
+    """Запуск сервиса до отмены задачи. ready(адрес, порт) вызывается,
+    когда сервер начал принимать соединения (порт 0 — любой свободный)."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        service = CalculationService(executor)
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        async with server:
+            address = server.sockets[0].getsockname()
+            if ready is not None:
+                ready(address[0], address[1])
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="nmcd_service", description="Локальный HTTP/JSON-сервис расчета НМЦД.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="адрес (по умолчанию — только локальные подключения)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="порт")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="процессов для формирования книг и крупных пакетов (по умолчанию — по числу ядер)")
+    args = parser.parse_args(argv)
+
+    def ready(host, port):
+        print(f"Сервис расчета НМЦД: http://{host}:{port}/", flush=True)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
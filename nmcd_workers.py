@@ -0,0 +1,195 @@
+# =====================================================
+# Калькулятор НМЦД — фоновые задачи для окна (QThreadPool)
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import os
+import tempfile
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+import nmcd_profile
+
+# Размер блока при копировании готового файла в место назначения
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Позиций в одном задании пакетного расчета из окна: меньше, чем в
+# командной строке, чтобы отмена срабатывала быстрее
+BATCH_CHUNK_SIZE = 100
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(int, str)   # проценты, этап
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Task(QRunnable):
+    """Выполнение fn(report, *args, **kwargs) в пуле потоков Qt.
+
+    fn сообщает о ходе работы через report(проценты, этап); после вызова
+    cancel() очередной report прерывает задачу исключением TaskCancelled.
+    Результат и ошибки возвращаются в поток окна сигналами self.signals.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def report(self, percent, stage=""):
+        if self._cancel_event.is_set():
+            raise TaskCancelled()
+        self.signals.progress.emit(int(percent), stage)
+
+    def run(self):
+        try:
+            result = self.fn(self.report, *self.args, **self.kwargs)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+def _copy_with_progress(report, source, destination, start_percent):
+    size = max(os.path.getsize(source), 1)
+    copied = 0
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            while True:
+                block = src.read(COPY_CHUNK_SIZE)
+                if not block:
+                    break
+                dst.write(block)
+                copied += len(block)
+                report(start_percent + (100 - start_percent) * copied / size, "Запись файла")
+    except BaseException:
+        # Недописанный файл на общем ресурсе не оставляем
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+
+
+@nmcd_profile.profiled("export")
+def export_justification(report, file_path, items, nmcd_date, total=None, **kwargs):
+    """Экспорт обоснования: книга формируется во временном локальном файле
+    и затем копируется в file_path блоками, чтобы медленная запись на
+    сетевой ресурс тоже показывала прогресс и могла быть отменена.
+
+    total — количество позиций для расчета процентов; kwargs передаются
+    в nmcd_excel.save_justification.
+    """
+    import nmcd_excel
+
+    report(0, "Формирование книги")
+    # До 80% — формирование листа, остальное — копирование
+    rows_progress = None
+    if total:
+        def rows_progress(rows):
+            report(80 * rows / total, "Формирование книги")
+
+    handle, temp_path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        result = nmcd_excel.save_justification(temp_path, items, nmcd_date, progress=rows_progress, **kwargs)
+        report(80, "Запись файла")
+        with nmcd_profile.phase("export.copy", bytes=os.path.getsize(temp_path)):
+            _copy_with_progress(report, temp_path, file_path, 80)
+    finally:
+        os.remove(temp_path)
+    return result
+
+
+def _process_context():
+    # Пулы процессов создаются из потока QThreadPool. fork() многопоточного
+    # процесса Qt может зависнуть на захваченной в другом потоке блокировке,
+    # поэтому исполнители запускаются как новые процессы
+    import multiprocessing
+
+    return multiprocessing.get_context("spawn")
+
+
+def import_offers(report, folder, item_names=None, workers=None):
+    """Импорт коммерческих предложений из каталога (nmcd_import.import_offers)."""
+    import nmcd_import
+
+    report(0, "Чтение предложений")
+
+    def file_progress(done, count):
+        report(100 * done / count, f"Прочитано файлов: {done} из {count}")
+
+    return nmcd_import.import_offers(folder, item_names, workers=workers, progress=file_progress,
+                                     mp_context=_process_context())
+
+
+@nmcd_profile.profiled("project.load")
+def load_project(report, input_path, exclude_outliers=False):
+    """Позиции из файла пакетного расчета как рассчитанный проект (nmcd_project.Project)."""
+    import nmcd_cli
+    import nmcd_project
+
+    report(0, "Чтение файла")
+    quotes = nmcd_cli.read_quotes(input_path)
+    report(80, "Расчет позиций")
+    project = nmcd_project.Project.from_quotes(quotes, exclude_outliers)
+    project.recalculate()
+    return project
+
+
+def open_project(report, path, exclude_outliers=False):
+    """Открытие файла проекта с пересчетом позиций, измененных после полного сохранения."""
+    import nmcd_project_file
+
+    report(0, "Открытие проекта")
+    project = nmcd_project_file.load_project(path)
+    report(50, "Расчет позиций")
+    project.set_exclude_outliers(exclude_outliers)
+    project.recalculate()
+    return project
+
+
+@nmcd_profile.profiled("batch")
+def batch_calculate(report, input_path, output_dir, nmcd_date, workers=None, exclude_outliers=False):
+    """Пакетный расчет из файла с записью книги на каждую позицию.
+
+    Возвращает объединенный результат calculate_batch; при
+    exclude_outliers в нем также маска "included" и число исключенных
+    предложений "excluded".
+    """
+    import numpy as np
+
+    import nmcd_cli
+
+    report(0, "Чтение файла")
+    quotes = nmcd_cli.read_quotes(input_path)
+    report(5, "Расчет и формирование книг")
+    os.makedirs(output_dir, exist_ok=True)
+
+    def chunk_progress(done, count):
+        report(5 + 95 * done / count, "Расчет и формирование книг")
+
+    result = nmcd_cli.calculate(quotes, nmcd_date, output_dir=output_dir, workers=workers,
+                                chunk_size=BATCH_CHUNK_SIZE, progress=chunk_progress,
+                                exclude_outliers=exclude_outliers, mp_context=_process_context())
+    if exclude_outliers:
+        # Матрица цен в окно не передается, поэтому исключенные считаются здесь
+        result["excluded"] = int((~np.isnan(quotes["prices"]) & ~result["included"]).sum())
+    return result
@@ -0,0 +1,40 @@
+# =====================================================
+# Калькулятор НМЦД — проверки пакетного расчета
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import numpy as np
+import pytest
+
+import nmcd_cli
+
+
+@pytest.mark.parametrize("row, message", [
+    ("Стул;1;A;inf", "Строка 2: некорректная цена «inf»."),
+    ("Стул;1;A;nan", "Строка 2: некорректная цена «nan»."),
+    ("Стул;1;A;-100", "Строка 2: некорректная цена «-100»."),
+    ("Стул;-1;A;100", "Строка 2: некорректное количество «-1»."),
+    ("Стул;NaN;A;100", "Строка 2: некорректное количество «NaN»."),
+])
+def test_read_quotes_rejects_invalid_numbers(tmp_path, row, message):
+    path = tmp_path / "позиции.csv"
+    path.write_text(f"Наименование;Количество;Поставщик;Цена\n{row}\n", encoding="utf-8")
+    with pytest.raises(ValueError) as error:
+        nmcd_cli.read_quotes(str(path))
+    assert str(error.value) == message
+
+
+def test_calculate_without_positions_returns_typed_arrays(tmp_path):
+    path = tmp_path / "позиции.csv"
+    path.write_text("Наименование;Поставщик;Цена\n", encoding="utf-8")
+    quotes = nmcd_cli.read_quotes(str(path))
+    result = nmcd_cli.calculate(quotes, None, exclude_outliers=True)
+    assert result["count"].dtype.kind == "i"
+    assert result["exceeds_limit"].dtype == bool
+    assert result["included"].dtype == bool
+    assert result["included"].shape == quotes["prices"].shape
+    assert int((~np.isnan(quotes["prices"]) & ~result["included"]).sum()) == 0
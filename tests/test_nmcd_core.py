@@ -0,0 +1,131 @@
+# =====================================================
+# Калькулятор НМЦД — проверки расчетного ядра
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import itertools
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+import nmcd_core
+
+
+def _coeff_variation(prices):
+    mean = statistics.fmean(prices)
+    return statistics.pstdev(prices) / mean * 100 if mean != 0 else 0.0
+
+
+def _largest_consistent_size(prices, limit=nmcd_core.COEFF_VARIATION_LIMIT):
+    # Перебор всех подмножеств от больших к меньшим
+    for size in range(len(prices), 1, -1):
+        if any(_coeff_variation(subset) <= limit + 1e-9 for subset in itertools.combinations(prices, size)):
+            return size
+    return min(len(prices), 1)
+
+
+def test_find_consistent_subset_matches_brute_force():
+    rng = np.random.default_rng(20240201)
+    for _ in range(3000):
+        count = int(rng.integers(2, 10))
+        # Группа близких цен, случайный разброс и выбросы, в том числе одинаковые цены
+        prices = np.round(rng.choice([100.0, 120.0, 150.0]) * rng.lognormal(0, rng.choice([0.1, 0.4, 1.0]), count))
+        subset = nmcd_core.find_consistent_subset(prices)
+        assert list(subset) == sorted(set(subset.tolist()))
+        assert len(subset) == _largest_consistent_size(prices.tolist()), prices
+        if len(subset) > 1:
+            assert _coeff_variation(prices[subset].tolist()) <= nmcd_core.COEFF_VARIATION_LIMIT + 1e-9
+
+
+@pytest.mark.parametrize("prices, expected", [
+    ([], []),
+    ([250.0], [0]),
+    # Ни одна пара не укладывается в 33% — остается наименьшая цена
+    ([1000.0, 10.0, 100.0], [1]),
+    # Среднее равно нулю: V считается нулевым, как в calculate_batch
+    ([0.0, 0.0], [0, 1]),
+    ([-5.0, 5.0], [0, 1]),
+])
+def test_find_consistent_subset_edge_cases(prices, expected):
+    assert nmcd_core.find_consistent_subset(prices).tolist() == expected
+
+
+def test_exclude_outliers_changes_only_rows_over_limit():
+    prices = np.array([
+        [100.0, 110.0, 1000.0, np.nan],     # V > 33%: выброс исключается
+        [100.0, 110.0, 120.0, np.nan],      # V в норме: без изменений
+        [np.nan, np.nan, np.nan, np.nan],   # нет предложений
+        [100.0, 105.0, 500.0, 110.0],       # цена 110 скрыта маской
+    ])
+    mask = np.ones(prices.shape, dtype=bool)
+    mask[3, 3] = False
+    keep = nmcd_core.exclude_outliers(prices, mask)
+    assert keep.tolist() == [
+        [True, True, False, False],
+        [True, True, True, False],
+        [False, False, False, False],
+        [True, True, False, False],
+    ]
+    result = nmcd_core.calculate_batch(prices, mask=keep)
+    assert not result["exceeds_limit"].any()
+    assert math.isnan(result["avg_price"][2])
+
+
+def test_running_stats_matches_full_recalculation():
+    rng = np.random.default_rng(7)
+    stats = nmcd_core.RunningStats()
+    prices = []
+    for _ in range(5000):
+        action = rng.integers(3) if prices else 0
+        if action == 0:
+            price = float(rng.uniform(1, 1e6))
+            stats.add(price)
+            prices.append(price)
+        elif action == 1:
+            stats.remove(prices.pop(int(rng.integers(len(prices)))))
+        else:
+            index = int(rng.integers(len(prices)))
+            new_price = float(rng.uniform(1, 1e6))
+            stats.replace(prices[index], new_price)
+            prices[index] = new_price
+
+        assert stats.count == len(prices)
+        if prices:
+            expected = nmcd_core.calculate_item(prices, 3)
+            result = stats.result(3)
+            # Погрешность — в пределах ошибки округления цен порядка 1e6
+            for key in ("avg_price", "std_dev", "nmcd_ryn"):
+                assert result[key] == pytest.approx(expected[key], rel=1e-9, abs=1e-3), key
+            assert result["coeff_variation"] == pytest.approx(expected["coeff_variation"], rel=1e-7, abs=1e-7)
+            assert result["exceeds_limit"] == expected["exceeds_limit"]
+
+
+def test_running_stats_remove_to_empty_and_replace_on_empty():
+    stats = nmcd_core.RunningStats([100.0, 200.0])
+    stats.remove(100.0)
+    assert (stats.count, stats.mean, stats.std_dev) == (1, 200.0, 0.0)
+    stats.remove(200.0)
+    assert (stats.count, stats.mean, stats.std_dev, stats.coeff_variation) == (0, 0.0, 0.0, 0.0)
+    with pytest.raises(ValueError):
+        stats.remove(200.0)
+    with pytest.raises(ValueError):
+        stats.replace(200.0, 300.0)
+    with pytest.raises(ValueError):
+        stats.result(1)
+
+    # Замена единственной цены дает ее же без разброса
+    stats.add(120.0)
+    stats.replace(120.0, 0.1)
+    assert (stats.count, stats.mean, stats.std_dev) == (1, 0.1, 0.0)
+    stats.remove(0.1)
+
+    # После опустошения накопитель снова считает с нуля
+    stats.add(50.0)
+    stats.add(70.0)
+    assert stats.result(2) == pytest.approx(nmcd_core.calculate_item([50.0, 70.0], 2))
@@ -0,0 +1,168 @@
+# =====================================================
+# Калькулятор НМЦД — проверки экспорта обоснования
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import re
+from datetime import datetime
+
+import openpyxl
+import pytest
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+
+import nmcd_excel
+from nmcd_results import ItemResult
+
+NMCD_DATE = datetime(2024, 2, 1)
+
+
+def _item(number, excluded=()):
+    return ItemResult(f"Позиция {number}", 2.0, "шт", (100.0, 110.0), ("A", "B"), tuple(excluded),
+                      105.0, 5.0, 4.76, 210.0, NMCD_DATE)
+
+
+def _values(path):
+    workbook = openpyxl.load_workbook(path)
+    return [[cell.value for cell in row] for row in workbook[nmcd_excel.SHEET_TITLE].iter_rows()]
+
+
+def test_exclusion_notes_spill_to_disk(tmp_path, monkeypatch):
+    # Пояснения не помещаются в буфер и уходят во временный файл, порядок и текст сохраняются
+    monkeypatch.setattr(nmcd_excel, "SPOOL_MAX_SIZE", 1024)
+    items = [_item(number, [("C\nD", 1000.0 + number)] if number % 2 else []) for number in range(1, 201)]
+    path = tmp_path / "обоснование.xlsx"
+    total = nmcd_excel.save_justification(str(path), iter(items), NMCD_DATE, subject="",
+                                          supplier_names=("A", "B"), columns=2)
+    assert total == 200 * 210.0
+
+    rows = _values(path)
+    title = next(index for index, row in enumerate(rows) if row[0] == nmcd_excel.EXCLUSIONS_TITLE)
+    assert rows[title - 2][0] == "ИТОГО:"
+    notes = [row[0] for row in rows[title + 1:title + 101]]
+    assert notes == [f"{number}. Позиция {number}: C\nD ({1000 + number:.2f})" for number in range(1, 201, 2)]
+    assert rows[title + 101][0] is None
+
+
+def test_combined_book_lists_suppliers_per_item(tmp_path):
+    # У позиций разные поставщики: столбцы цен без имен, поставщики — под таблицей
+    items = [_item(1), ItemResult("Стол", 1.0, "шт", (900.0, 1000.0, 1100.0), ("B", "C", "D"), (("E", 5000.0),),
+                                  1000.0, 81.65, 8.16, 1000.0, NMCD_DATE)]
+    path = tmp_path / "обоснование.xlsx"
+    nmcd_excel.save_justification(str(path), items, NMCD_DATE, subject="", supplier_names=(), columns=3)
+
+    rows = _values(path)
+    assert rows[8][4:7] == ["Предложение 1", "Предложение 2", "Предложение 3"]
+    assert not any(re.fullmatch(r"Поставщик \d+", str(value)) for row in rows for value in row)
+    title = next(index for index, row in enumerate(rows) if row[0] == nmcd_excel.SUPPLIERS_TITLE)
+    assert rows[title - 2][0] == "ИТОГО:"
+    assert [row[0] for row in rows[title + 1:title + 3]] == ["1. Позиция 1: A, B", "2. Стол: B, C, D"]
+    assert rows[title + 4][0] == nmcd_excel.EXCLUSIONS_TITLE
+    assert rows[title + 5][0] == "2. Стол: E (5000.00)"
+
+
+@pytest.mark.parametrize("sheet_xml", [
+    '<worksheet><cols/><sheetData></sheetData><pageSetup/></worksheet>',
+    '<worksheet><cols/><sheetData/><pageSetup/></worksheet>',
+    '<worksheet><cols/><sheetData />\n<pageSetup/></worksheet>',
+])
+def test_split_sheet_xml(sheet_xml):
+    head, tail = nmcd_excel.split_sheet_xml(sheet_xml)
+    assert head == b"<worksheet><cols/><sheetData>"
+    assert tail.startswith(b"</sheetData>") and tail.endswith(b"<pageSetup/></worksheet>")
+
+
+def test_split_sheet_xml_without_sheet_data():
+    with pytest.raises(RuntimeError, match="sheetData"):
+        nmcd_excel.split_sheet_xml("<worksheet><sheetData><row/></sheetData></worksheet>")
+
+
+def _reference_workbook(path, items, subject, supplier_names, columns):
+    # Книга, собранная средствами openpyxl, как до появления шаблона
+    columns = max(columns, nmcd_excel.SUPPLIER_COLUMNS)
+    workbook = nmcd_excel.new_workbook()
+    sheet = workbook.create_sheet(nmcd_excel.SHEET_TITLE)
+    widths = nmcd_excel.column_widths(columns)
+    for index, width in enumerate(widths, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+    sheet.page_setup.orientation = "landscape"
+    sheet.page_setup.fitToPage = True
+    sheet.page_setup.fitToWidth = 1
+    sheet.page_setup.fitToHeight = 0
+    for row in (3, 4, 6, 8):
+        sheet.merged_cells.add(f"A{row}:{get_column_letter(len(widths))}{row}")
+
+    def styled(values, style):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.style = style
+            cells.append(cell)
+        return cells
+
+    sheet.append(styled(["Заказчик:"], "НМЦД: жирный"))
+    sheet.append([])
+    sheet.append(styled([nmcd_excel.HEADER_TEXT], "НМЦД: заголовок"))
+    sheet.append(styled([subject], "НМЦД: заголовок"))
+    sheet.append([])
+    sheet.append(styled([nmcd_excel.LEGAL_TEXT], "НМЦД: перенос"))
+    sheet.append([])
+    sheet.append(styled([nmcd_excel.TABLE_TITLE], "НМЦД: жирный"))
+    sheet.append(styled(nmcd_excel.header_row(supplier_names, columns), "НМЦД: шапка таблицы"))
+    sheet.append(styled([str(i) for i in range(1, len(widths) + 1)], "НМЦД: ячейка"))
+    for number, data in enumerate(items, start=1):
+        sheet.append(styled(nmcd_excel.item_row(number, data, columns), "НМЦД: ячейка"))
+    sheet.append([])
+    sheet.append(styled(nmcd_excel.total_row(sum(data.nmcd_ryn for data in items), columns), "НМЦД: итого"))
+    sheet.append([])
+    for title, notes in (
+            (nmcd_excel.SUPPLIERS_TITLE,
+             [] if supplier_names else [nmcd_excel.supplier_note(n, data) for n, data in enumerate(items, start=1)]),
+            (nmcd_excel.EXCLUSIONS_TITLE,
+             [nmcd_excel.exclusion_note(n, data, data.excluded) for n, data in enumerate(items, start=1)
+              if data.excluded])):
+        if notes:
+            sheet.append(styled([title], "НМЦД: жирный"))
+            for note in notes:
+                sheet.append([note])
+            sheet.append([])
+    date_cells = styled(["Дата подготовки обоснования НМЦК:", NMCD_DATE.strftime("%d.%m.%Y")], "НМЦД: жирный")
+    sheet.append([date_cells[0], None, None, date_cells[1]])
+    sheet.append(styled(["Ф. И. О. исполнителя:"], "НМЦД: жирный"))
+    nmcd_excel.write_formulas_sheet(workbook)
+    workbook.save(path)
+
+
+def _describe(path):
+    workbook = openpyxl.load_workbook(path)
+    sheets = []
+    for sheet in workbook.worksheets:
+        cells = {cell.coordinate: (cell.value, cell.style, cell.font.b, cell.font.i, cell.font.sz,
+                                   cell.alignment.horizontal, cell.alignment.vertical, cell.alignment.wrap_text,
+                                   tuple(getattr(side, "style", None) for side in (
+                                       cell.border.left, cell.border.right, cell.border.top, cell.border.bottom)))
+                 for row in sheet.iter_rows() for cell in row if cell.value is not None or cell.has_style}
+        sheets.append({
+            "title": sheet.title,
+            "cells": cells,
+            "merged": sorted(str(cell_range) for cell_range in sheet.merged_cells.ranges),
+            "widths": {letter: dimension.width for letter, dimension in sheet.column_dimensions.items()},
+            "page_setup": (sheet.page_setup.orientation, sheet.page_setup.fitToWidth, sheet.page_setup.fitToHeight,
+                           sheet.sheet_properties.pageSetUpPr.fitToPage if sheet.sheet_properties.pageSetUpPr else None),
+        })
+    return sheets
+
+
+@pytest.mark.parametrize("supplier_names, columns", [(("A", "B"), 2), ((), 5)])
+def test_template_matches_openpyxl_workbook(tmp_path, supplier_names, columns):
+    items = [_item(number, [("C", 1000.0 + number)] if number % 3 == 0 else []) for number in range(1, 8)]
+    subject = "Мебель для офиса"
+    templated, reference = tmp_path / "шаблон.xlsx", tmp_path / "openpyxl.xlsx"
+    nmcd_excel.save_justification(str(templated), items, NMCD_DATE, subject=subject,
+                                  supplier_names=supplier_names, columns=columns)
+    _reference_workbook(str(reference), items, subject, supplier_names, columns)
+    assert _describe(templated) == _describe(reference)
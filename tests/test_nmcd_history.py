@@ -0,0 +1,35 @@
+# =====================================================
+# Калькулятор НМЦД — проверки истории цен
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+from datetime import datetime
+
+import nmcd_history
+
+
+def test_latest_quotes_takes_last_recorded_price_of_latest_date():
+    history = nmcd_history.PriceHistory(":memory:")
+    try:
+        history.record("Стул офисный", "шт", [("A", 100.0), ("B", 200.0)], datetime(2024, 1, 10))
+        history.record("Стул офисный", "шт", [("A", 130.0)], datetime(2024, 2, 1))
+        # Два предложения A на одну (последнюю) дату: последним записано 90
+        history.record("Стул офисный", "шт", [("A", 120.0)], datetime(2024, 3, 1))
+        history.record("Стул офисный", "шт", [("A", 90.0)], datetime(2024, 3, 1))
+        # Более ранняя дата, записанная позже, последней не считается
+        history.record("Стул офисный", "шт", [("B", 50.0)], datetime(2023, 12, 1))
+
+        unit, quotes = history.latest_quotes("стул  офисный")
+        assert unit == "шт"
+        assert quotes == [("A", 90.0, "2024-03-01"), ("B", 200.0, "2024-01-10")]
+
+        # То же в обратном порядке цен: выбор не зависит от порядка строк в индексе
+        history.record("Стол", "шт", [("A", 90.0)], datetime(2024, 3, 1))
+        history.record("Стол", "шт", [("A", 120.0)], datetime(2024, 3, 1))
+        assert history.latest_quotes("Стол")[1] == [("A", 120.0, "2024-03-01")]
+    finally:
+        history.close()
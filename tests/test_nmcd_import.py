@@ -0,0 +1,40 @@
+# =====================================================
+# Калькулятор НМЦД — проверки импорта предложений
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+from datetime import datetime
+
+import pytest
+
+import nmcd_import
+
+
+def test_parse_offer_price():
+    assert nmcd_import.parse_offer_price("1.234,50") == 1234.5
+    assert nmcd_import.parse_offer_price("1,234.50") == 1234.5
+    assert nmcd_import.parse_offer_price("1 234,50 руб.") == 1234.5
+    assert nmcd_import.parse_offer_price("12,5") == 12.5
+    assert nmcd_import.parse_offer_price("1\xa0234 ₽") == 1234.0
+    assert nmcd_import.parse_offer_price("1.234.567") == 1234567.0
+    assert nmcd_import.parse_offer_price(150) == 150.0
+    assert nmcd_import.parse_offer_price(datetime(2024, 2, 1)) is None
+
+
+@pytest.mark.parametrize("value", [
+    "по запросу (от 5 шт.)", "Цена действительна 30 дней", "nan", "inf", "1e400", "9" * 400,
+    "-5", "1.234.5", "", None, float("nan"), float("inf"), -3])
+def test_not_a_price(value):
+    assert nmcd_import.parse_offer_price(value) is None
+
+
+def test_totals_rows_are_not_items(tmp_path):
+    path = tmp_path / "Ромашка.csv"
+    path.write_text("Наименование;Кол-во;Цена\nСтул;2;100\nСтол;1;1.234,50\n"
+                    "Итого;;1434,50\nВ т.ч. НДС 20%;;239,08\nВсего к оплате:;;1434,50\n", encoding="utf-8")
+    offers = nmcd_import.read_offer_file(str(path))
+    assert [(name, price) for _, name, _, _, _, price in offers] == [("Стул", 100.0), ("Стол", 1234.5)]
@@ -0,0 +1,56 @@
+# =====================================================
+# Калькулятор НМЦД — проверки проекта из нескольких позиций
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import numpy as np
+import pytest
+
+import nmcd_project
+
+
+def _full_recalculation(project):
+    reference = nmcd_project.Project.from_quotes(project.quotes(), project.exclude_outliers)
+    reference.recalculate()
+    return reference
+
+
+@pytest.mark.parametrize("exclude_outliers", [False, True])
+def test_incremental_total_matches_full_recalculation(exclude_outliers):
+    rng = np.random.default_rng(16)
+    project = nmcd_project.Project(exclude_outliers=exclude_outliers)
+    for number in range(20):
+        project.add_position(f"Позиция {number}", float(rng.integers(1, 10)), "шт",
+                             ["A", "B", "C"], rng.uniform(100, 200, 3).round(2))
+    project.recalculate()
+
+    for step in range(400):
+        action = rng.integers(4) if len(project) else 3
+        if action == 0:
+            row = int(rng.integers(len(project)))
+            column = int(rng.integers(project.columns + 1))
+            # Иногда — удаление предложения или цена-выброс
+            price = None if rng.random() < 0.2 else float(rng.choice([rng.uniform(100, 200), rng.uniform(1000, 5000)]))
+            project.set_price(row, column, price)
+        elif action == 1:
+            project.set_quantity(int(rng.integers(len(project))), float(rng.integers(1, 100)))
+        elif action == 2:
+            rows = rng.choice(len(project), size=min(len(project), int(rng.integers(1, 3))), replace=False)
+            project.remove_positions(rows.tolist())
+        else:
+            count = int(rng.integers(0, 5))
+            project.add_position(f"Новая {step}", float(rng.integers(1, 10)), "шт",
+                                 [f"П{i}" for i in range(count)], rng.uniform(100, 200, count).round(2))
+        # Правки иногда накапливаются до пересчета, как в окне при быстром вводе
+        if rng.random() < 0.7:
+            project.recalculate()
+            reference = _full_recalculation(project)
+            assert project.total == pytest.approx(reference.total, rel=1e-9, abs=1e-6), step
+            for name in nmcd_project.RESULT_COLUMNS:
+                np.testing.assert_allclose(getattr(project, name), getattr(reference, name), rtol=1e-12,
+                                           err_msg=f"{name}, шаг {step}")
+            np.testing.assert_array_equal(project.included, reference.included)
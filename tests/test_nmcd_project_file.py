@@ -0,0 +1,48 @@
+# =====================================================
+# Калькулятор НМЦД — проверки файла проекта
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import os
+
+import nmcd_project
+import nmcd_project_file
+
+
+def _project():
+    project = nmcd_project.Project()
+    project.add_position("Стул", 2, "шт", ["A", "B"], [100.0, 110.0])
+    project.add_position("Стол", 1, "шт", ["A", "B"], [1000.0, 1200.0])
+    project.recalculate()
+    return project
+
+
+def test_save_after_torn_journal_record(tmp_path):
+    path = str(tmp_path / "проект.nmcdp")
+    project = _project()
+    nmcd_project_file.save_project(path, project)
+    project.set_quantity(0, 5)
+    nmcd_project_file.save_project(path, project)
+
+    # Сбой во время дописывания: от записи количества остается часть
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+
+    reopened = nmcd_project_file.load_project(path)
+    assert reopened.quantities[0] == 2
+    reopened.set_quantity(1, 3)
+    nmcd_project_file.save_project(path, reopened)
+
+    saved = nmcd_project_file.load_project(path)
+    saved.recalculate()
+    assert list(saved.quantities) == [2, 3]
+    assert saved.total == 2 * 105.0 + 3 * 1100.0
+
+    # Файл снова пригоден для дописывания
+    saved.set_price(0, 1, 120.0)
+    nmcd_project_file.save_project(path, saved)
+    assert nmcd_project_file.load_project(path).prices[0, 1] == 120.0
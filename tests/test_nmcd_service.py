@@ -0,0 +1,131 @@
+# =====================================================
+# Калькулятор НМЦД — проверки сервиса расчета
+# Автор: Анна Черкасова (https://cherkasovaanna.ru/)
+#
+# ⚠️ Использование в коммерческих целях —
+#    только с письменного разрешения автора.
+#    Контакты: anna@cherkasovaanna.ru | ТГ @annac1119
+# =====================================================
+
+import asyncio
+import contextlib
+import http.client
+import io
+import json
+import threading
+
+import openpyxl
+import pytest
+
+import nmcd_service
+
+
+@pytest.fixture(scope="module")
+def service():
+    """Сервис на свободном порту localhost в отдельном потоке; возвращает (адрес, порт)."""
+    started = threading.Event()
+    state = {}
+
+    def ready(host, port):
+        state["address"] = (host, port)
+        started.set()
+
+    async def run():
+        state["loop"], state["task"] = asyncio.get_running_loop(), asyncio.current_task()
+        await nmcd_service.serve("127.0.0.1", 0, workers=1, ready=ready)
+
+    def thread_main():
+        # asyncio.run при остановке отменяет и незавершенные обработчики соединений
+        with contextlib.suppress(asyncio.CancelledError):
+            asyncio.run(run())
+
+    thread = threading.Thread(target=thread_main, daemon=True)
+    thread.start()
+    assert started.wait(10)
+    yield state["address"]
+    state["loop"].call_soon_threadsafe(state["task"].cancel)
+    thread.join(10)
+
+
+def _request(service, method, path, payload=None):
+    connection = http.client.HTTPConnection(*service, timeout=60)
+    try:
+        body = None if payload is None else json.dumps(payload).encode("utf-8")
+        connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, response.getheader("Content-Type"), response.read()
+    finally:
+        connection.close()
+
+
+def _items(count):
+    return [{"item_name": f"Позиция {number}", "quantity": 2, "supplier_names": ["A", "B", "C", "D"],
+             "prices": [100, None, 110, 1000]} for number in range(count)]
+
+
+def test_empty_price_keeps_supplier_names_aligned():
+    quotes = nmcd_service.quotes_from_json([
+        {"item_name": "Стул", "prices": [100, None, 120, ""], "supplier_names": ["A", "B", "C", "D"]}])
+    assert quotes["supplier_names"] == [["A", "C"]]
+    assert list(quotes["prices"][0]) == [100.0, 120.0]
+
+
+@pytest.mark.parametrize("price", ["nan", "inf", "1e400", 10 ** 400, -5])
+def test_invalid_price_rejected(price):
+    body = json.dumps({"items": [{"item_name": "Стул", "prices": [price, 100]}]}).encode("utf-8")
+    error, result = nmcd_service._run_request(nmcd_service.calculate_payload, body)
+    assert error[0] == 400 and result is None
+
+
+@pytest.mark.parametrize("handler, payload", [
+    (nmcd_service.calculate_payload, {"items": [{"item_name": "Стул", "prices": [100], "quantity": 0}]}),
+    (nmcd_service.calculate_payload, {"items": [{"item_name": "Стул", "prices": [100], "quantity": -0.5}]}),
+    (nmcd_service.calculate_payload, {"items": [{"item_name": "Стул", "prices": [100, 110], "supplier_names": "xy"}]}),
+    (nmcd_service.justification_payload, {"items": [{"item_name": "Стул", "prices": [100]}], "date": 5}),
+    (nmcd_service.justification_payload, {"items": [{"item_name": "Стул", "prices": [100]}], "date": "31.02.2024"}),
+])
+def test_invalid_fields_rejected(handler, payload):
+    error, result = nmcd_service._run_request(handler, json.dumps(payload).encode("utf-8"))
+    assert error[0] == 400 and result is None
+
+
+def test_health(service):
+    status, _, content = _request(service, "GET", "/health")
+    assert status == 200 and json.loads(content) == {"status": "ok"}
+
+
+@pytest.mark.parametrize("exclude_outliers, count", [
+    (False, 1),                                  # в цикле событий
+    (True, 1),                                   # в пуле процессов: исключение выбросов
+    (True, 2000),                                # в пуле процессов: тело больше INLINE_BODY_SIZE
+])
+def test_calculate(service, exclude_outliers, count):
+    payload = {"items": _items(count), "exclude_outliers": exclude_outliers}
+    if count > 1:
+        assert len(json.dumps(payload).encode("utf-8")) > nmcd_service.INLINE_BODY_SIZE
+    status, content_type, content = _request(service, "POST", "/calculate", payload)
+    assert status == 200 and content_type.startswith("application/json")
+    result = json.loads(content)
+    assert len(result["items"]) == count
+    item = result["items"][-1]
+    if exclude_outliers:
+        assert item["count"] == 2 and item["avg_price"] == 105.0 and item["nmcd_ryn"] == 210.0
+        assert item["excluded"] == [{"supplier": "D", "price": 1000.0}]
+    else:
+        assert item["count"] == 3 and item["excluded"] == []
+    assert result["total"] == pytest.approx(count * item["nmcd_ryn"])
+
+
+def test_calculate_errors(service):
+    assert _request(service, "POST", "/calculate", {"items": []})[0] == 400
+    assert _request(service, "GET", "/calculate")[0] == 405
+    assert _request(service, "POST", "/unknown", {})[0] == 404
+
+
+def test_justification(service):
+    payload = {"items": _items(1), "exclude_outliers": True, "date": "01.02.2024"}
+    status, content_type, content = _request(service, "POST", "/justification", payload)
+    assert status == 200 and content_type == nmcd_service.XLSX_CONTENT_TYPE
+    workbook = openpyxl.load_workbook(io.BytesIO(content))
+    values = [value for row in workbook.worksheets[0].iter_rows(values_only=True) for value in row]
+    assert "Позиция 0" in values